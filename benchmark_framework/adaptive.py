@@ -0,0 +1,114 @@
+import json
+import math
+import os
+import random
+from itertools import combinations
+from statistics import NormalDist
+
+import numpy as np
+
+
+def shuffled_items(tasks, seed=0):
+    """
+    Every (task type, item) pair across the task sets in one seeded random order, so any
+    prefix of it is a fair sample of the whole benchmark. The items have to be read
+    into memory for the shuffle.
+    """
+    pool = [
+        (task_type, {**item, "id": item.get("id", i)})
+        for task_type, task_data in tasks.items()
+        for i, item in enumerate(task_data)
+    ]
+    random.Random(seed).shuffle(pool)
+    return pool
+
+
+class SequentialComparison:
+    """
+    Running paired comparisons between models on the items they have all answered.
+
+    For each pair the per-item score differences get a normal-approximation interval.
+    Because the intervals are checked after every batch, look k uses
+    alpha * 6 / (pi^2 k^2), split evenly over the pairs. Those sum to at most alpha over
+    any number of looks, so stopping as soon as the intervals look settled does not
+    inflate the error rate.
+
+    A pair is decided once its interval excludes 0, or lies within +/- `margin` (a
+    practical tie). The ranking is settled when every adjacent pair in it is decided.
+    """
+
+    def __init__(self, models, confidence=0.95, margin=0.02, min_items=20):
+        self.models = list(models)
+        self.alpha = 1 - confidence
+        self.margin = margin
+        self.min_items = min_items
+        self.looks = 0
+        # model -> {(task, item_id): [scores over repetitions]}
+        self.scores = {model: {} for model in self.models}
+
+    def add(self, model, task_type, record):
+        self.scores[model].setdefault((task_type, record["item_id"]), []).append(record["score"])
+
+    def _paired(self, a, b):
+        common = self.scores[a].keys() & self.scores[b].keys()
+        return np.array([np.mean(self.scores[a][k]) - np.mean(self.scores[b][k]) for k in common])
+
+    def look(self):
+        """Records one interim check; call it once per batch, before reading intervals."""
+        self.looks += 1
+
+    def intervals(self):
+        pairs = list(combinations(self.models, 2))
+        look_alpha = self.alpha / max(len(pairs), 1) * 6 / (math.pi ** 2 * max(self.looks, 1) ** 2)
+        z = NormalDist().inv_cdf(1 - look_alpha / 2)
+
+        results = []
+        for a, b in pairs:
+            diffs = self._paired(a, b)
+            n = len(diffs)
+            mean_diff = float(diffs.mean()) if n else 0.0
+            half = z * diffs.std(ddof=1) / math.sqrt(n) if n > 1 else math.inf
+            low, high = mean_diff - half, mean_diff + half
+
+            if n < self.min_items:
+                verdict = "unsettled"
+            elif low > 0:
+                verdict = f"{a} > {b}"
+            elif high < 0:
+                verdict = f"{b} > {a}"
+            elif -self.margin <= low and high <= self.margin:
+                verdict = "tied"
+            else:
+                verdict = "unsettled"
+            results.append({"a": a, "b": b, "items": n, "mean_diff": mean_diff,
+                            "ci_low": low, "ci_high": high, "verdict": verdict})
+        return results
+
+    def ranking(self):
+        means = {m: float(np.mean([np.mean(v) for v in self.scores[m].values()])) if self.scores[m] else 0.0
+                 for m in self.models}
+        return sorted(self.models, key=lambda m: -means[m]), means
+
+    def settled(self):
+        if len(self.models) < 2:
+            return False
+        decided = {(p["a"], p["b"]): p["verdict"] != "unsettled" for p in self.intervals()}
+        order, _ = self.ranking()
+        return all(decided.get((a, b), decided.get((b, a))) for a, b in zip(order, order[1:]))
+
+
+def save_adaptive(result, results_dir="results"):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, "adaptive.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def load_adaptive(results_dir="results"):
+    """The adaptive run's stopping summary, or None when the run wasn't adaptive."""
+    path = os.path.join(results_dir, "adaptive.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,195 @@
+import json
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+
+
+class Backend(ABC):
+    """
+    What LLMBenchmark needs from a model server; mirrors the ollama.Client methods it uses.
+
+    chat() returns an Ollama-shaped response ({"message": {"content": ...}, "eval_count": ...,
+    durations in nanoseconds}) or, with stream=True, an iterator of such chunks whose last
+    one has done=True and carries the counters. generate() is used to load and unload
+    models, list() to read their digests. A backend missing any of them fails when it is
+    constructed rather than partway through a run.
+    """
+
+    @abstractmethod
+    def chat(self, model, messages, stream=False, options=None, keep_alive=None):
+        ...
+
+    @abstractmethod
+    def generate(self, model, prompt=None, stream=False, options=None, keep_alive=None):
+        ...
+
+    @abstractmethod
+    def list(self):
+        ...
+
+
+class OllamaBackend(Backend):
+    """A live Ollama server, through the official client."""
+
+    def __init__(self, host=None):
+        import ollama
+        self.host = host
+        self._client = ollama.Client(host=host)
+
+    def chat(self, model, messages, stream=False, options=None, keep_alive=None):
+        return self._client.chat(model=model, messages=messages, stream=stream,
+                                 options=options, keep_alive=keep_alive)
+
+    def generate(self, model, prompt=None, stream=False, options=None, keep_alive=None):
+        return self._client.generate(model=model, prompt=prompt, stream=stream,
+                                     options=options, keep_alive=keep_alive)
+
+    def list(self):
+        return self._client.list()
+
+
+def load_replay(path):
+    """
+    {(model, prompt): response} from a recorded JSONL file, e.g. a previous run's
+    results/responses.jsonl. Records without a model match any model.
+    """
+    replay = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                replay[(row.get("model"), row["prompt"])] = row["response"]
+    return replay
+
+
+class MockBackend(Backend):
+    """
+    Offline stand-in for Ollama with configurable latency and token rates.
+
+    Responses come from a replay file when the (model, prompt) was recorded, and are
+    otherwise synthetic. Timing is simulated: a per-request base latency drawn from
+    `latency_dist` ("fixed", "exponential" or "lognormal" around `latency_sec`), prompt
+    eval at `prompt_tokens_per_sec`, then decode at `tokens_per_sec`. `time_scale`
+    multiplies every sleep, so 0 measures pure harness overhead at any item count.
+    Reported durations are the simulated ones, unscaled. `num_parallel` caps requests
+    served at once (like OLLAMA_NUM_PARALLEL); the rest queue, so load tests saturate.
+    With `prompt_cache`, the words a prompt shares as a prefix with the model's previous
+    prompt are not evaluated again (or counted in prompt_eval_count), as with Ollama's KV cache.
+    """
+
+    def __init__(self, latency_sec=0.2, latency_dist="lognormal", latency_sigma=0.5,
+                 tokens_per_sec=40.0, prompt_tokens_per_sec=800.0, response_tokens=64,
+                 load_sec=2.0, time_scale=1.0, replay_path=None, models=("mock",), seed=0,
+                 num_parallel=None, prompt_cache=True):
+        self.latency_sec = latency_sec
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.tokens_per_sec = tokens_per_sec
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.response_tokens = response_tokens
+        self.load_sec = load_sec
+        self.time_scale = time_scale
+        self.replay = load_replay(replay_path) if replay_path else {}
+        self.models = list(models)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._loaded = set()
+        self._slots = threading.Semaphore(num_parallel) if num_parallel else nullcontext()
+        self.prompt_cache = prompt_cache
+        self._last_prompt = {}
+
+    def _base_latency(self):
+        with self._rng_lock:
+            if self.latency_dist == "fixed":
+                return self.latency_sec
+            if self.latency_dist == "exponential":
+                return self._rng.expovariate(1 / self.latency_sec) if self.latency_sec else 0.0
+            if self.latency_dist == "lognormal":
+                # mu chosen so the distribution's mean is latency_sec
+                mu = -0.5 * self.latency_sigma ** 2
+                return self.latency_sec * self._rng.lognormvariate(mu, self.latency_sigma)
+        raise ValueError(f"Unknown latency distribution '{self.latency_dist}'")
+
+    def _sleep(self, seconds):
+        if self.time_scale and seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _response_text(self, model, prompt):
+        if (model, prompt) in self.replay:
+            return self.replay[(model, prompt)]
+        if (None, prompt) in self.replay:
+            return self.replay[(None, prompt)]
+        words = prompt.split() or ["ok"]
+        return " ".join(words[i % len(words)] for i in range(self.response_tokens))
+
+    def _load(self, model, keep_alive):
+        # the first request after an unload pays the load time, like a real server
+        if keep_alive == 0:
+            self._loaded.discard(model)
+            self._last_prompt.pop(model, None)
+            return 0.0
+        if model in self._loaded:
+            return 0.0
+        self._loaded.add(model)
+        return self.load_sec
+
+    def chat(self, model, messages, stream=False, options=None, keep_alive=None):
+        prompt = messages[-1]["content"]
+        load = self._load(model, keep_alive)
+        tokens = self._response_text(model, prompt).split(" ")
+        prompt_tokens = self._uncached_tokens(model, prompt.split())
+        prompt_eval = prompt_tokens / self.prompt_tokens_per_sec
+        decode = len(tokens) / self.tokens_per_sec
+        base = self._base_latency()
+
+        final = {
+            "model": model,
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_eval * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(decode * 1e9),
+            "total_duration": int((load + base + prompt_eval + decode) * 1e9),
+        }
+
+        if not stream:
+            with self._slots:
+                self._sleep(load + base + prompt_eval + decode)
+            final["message"]["content"] = " ".join(tokens)
+            return final
+        return self._stream(tokens, load + base + prompt_eval, final)
+
+    def _uncached_tokens(self, model, words):
+        if not self.prompt_cache:
+            return len(words)
+        previous = self._last_prompt.get(model, [])
+        self._last_prompt[model] = words
+        shared = 0
+        for a, b in zip(words, previous):
+            if a != b:
+                break
+            shared += 1
+        # the last prompt token is always evaluated, as on a real server
+        return max(len(words) - shared, 1)
+
+    def _stream(self, tokens, first_token_delay, final):
+        with self._slots:
+            self._sleep(first_token_delay)
+            per_token = 1 / self.tokens_per_sec
+            for i, token in enumerate(tokens):
+                if i:
+                    self._sleep(per_token)
+                yield {"message": {"role": "assistant", "content": token if i == 0 else " " + token}, "done": False}
+        yield final
+
+    def generate(self, model, prompt=None, stream=False, options=None, keep_alive=None):
+        load = self._load(model, keep_alive)
+        self._sleep(load)
+        return {"model": model, "response": "", "done": True, "load_duration": int(load * 1e9)}
+
+    def list(self):
+        return {"models": [{"model": m, "digest": f"mock-{m}"} for m in self.models]}
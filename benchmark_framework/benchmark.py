@@ -1,79 +1,605 @@
 import os
 import time
-import json
-import tracemalloc
 from statistics import mean
-from difflib import SequenceMatcher
-import ollama
-from bert_score import score as bert_score
 import threading
 import sys
 import itertools
-import re
-import ast
+from contextlib import nullcontext
+from benchmark_framework.adaptive import SequentialComparison, shuffled_items
+from benchmark_framework.backends import OllamaBackend
+from benchmark_framework.cache import ResponseCache
+from benchmark_framework.evaluation import ScoringService
+from benchmark_framework.dispatcher import Dispatcher
+from benchmark_framework.pipeline import Pipeline
+from benchmark_framework.resources import ResourceSampler
+from benchmark_framework.sandbox import CodeSandbox
+from benchmark_framework.scheduler import RequestScheduler, prefix_order
+from benchmark_framework.lexical import score_qa_batch
+from benchmark_framework.scoring import BATCH_SCORED_TASKS, bert_f1, extract_code, ast_similarity
+from benchmark_framework.stats import bootstrap_ci, describe
+from benchmark_framework.store import BODY_COLUMNS, ResultStore, load_results, measured_records, record_key
+from benchmark_framework.tasks import TASK_SCORERS
+from benchmark_framework.tracing import get_tracer, span, traced
+
+# per-request timings Ollama reports on the final response, durations in nanoseconds
+OLLAMA_DURATION_FIELDS = ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+OLLAMA_COUNT_FIELDS = ("prompt_eval_count", "eval_count")
+
+# per-record metrics averaged by get_summary_statistics, as (record key, summary key)
+GENERATION_METRICS = [
+    ("ttft_sec", "avg_ttft_sec"),
+    ("inter_token_latency_sec", "avg_inter_token_latency_sec"),
+    ("decode_tokens_per_sec", "avg_decode_tokens_per_sec"),
+    ("prompt_eval_sec", "avg_prompt_eval_sec"),
+    ("load_sec", "avg_load_sec"),
+]
+
+# per-record score metrics, averaged over every record including response-cache hits
+SCORE_METRICS = [
+    ("exact_match", "avg_exact_match"),
+    ("f1", "avg_f1"),
+]
 
 class LLMBenchmark:
-    def __init__(self, models, tasks):
+    def __init__(self, models, tasks, host=None, concurrency=1, max_per_model=None, max_per_server=None,
+                 bert_batch_size=64, options=None, cache_path=None,
+                 code_workers=4, code_timeout=10.0, code_memory_mb=512, stream=False,
+                 server_process="ollama", sample_interval=0.1, bootstrap_resamples=1000,
+                 warmup=1, repetitions=1, measure_cold_start=True, results_dir="results",
+                 endpoints=None, backend=None, pipeline=False, score_workers=2, queue_size=64,
+                 keep_alive=-1, order="prefix", prefix_window=256, score_cache_path=None, score_processes=None,
+                 resume=False):
         self.models = models
         self.tasks = tasks
-        self.results = {}
         self._thinking = False
-        os.makedirs("results", exist_ok=True)
+        self._print_lock = threading.Lock()
 
+        # a single client is shared by every worker thread; any Backend (e.g. MockBackend) can stand in
+        self.client = backend or OllamaBackend(host)
+        self.host = host or os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+
+        # generation options passed to every chat call (temperature, seed, num_ctx, ...)
+        self.options = options or {}
+
+        # streaming adds time-to-first-token and inter-token latency to each record
+        self.stream = stream
+
+        # models stay loaded while they are benchmarked (-1 = until released) and are unloaded
+        # once done, so the server never evicts one mid-sweep; None leaves the server default
+        self.keep_alive = keep_alive
+
+        # "prefix" runs prompts sharing a template prefix back to back (sorted within windows of
+        # `prefix_window` items) so the server's prompt cache is reused; "dataset" keeps file order
+        self.order = order
+        self.prefix_window = prefix_window
+        self._last_prompts = {}
+
+        # concurrency=1 keeps the original one-request-at-a-time loop
+        self.scheduler = None
+        if concurrency > 1:
+            self.scheduler = RequestScheduler(concurrency, max_per_model, max_per_server)
+
+        # several Ollama hosts: (model, item) units are spread over them by a work-stealing dispatcher
+        self.dispatcher = Dispatcher(endpoints) if endpoints else None
+
+        # BERTScore and code tasks are scored in chunks of this many records as they arrive
+        self.bert_batch_size = bert_batch_size
+
+        # pipelined mode overlaps generation with scoring on separate worker threads
+        self.pipeline = pipeline
+        self.score_workers = score_workers
+        self.queue_size = queue_size
+        self.pipeline_stats = {}
+
+        # generated code runs in reusable subprocess workers, never in this process
+        self.sandbox = CodeSandbox(code_workers, code_timeout, code_memory_mb)
+
+        # batch scoring dedupes pairs, memoizes scores (None disables the score cache) and
+        # runs the CPU-bound scorers on `score_processes` processes
+        self.scorer = ScoringService(self.sandbox, score_cache_path, score_processes, bert_batch_size)
+
+        # polls the model server's memory/CPU in the background while items run
+        self.sampler = ResourceSampler(server_process, sample_interval)
+
+        # resamples behind the 95% confidence intervals in get_summary_statistics
+        self.bootstrap_resamples = bootstrap_resamples
+
+        # warmup requests are sent per model and never recorded; each item runs `repetitions` times
+        self.warmup = warmup
+        self.repetitions = repetitions
+        self.measure_cold_start = measure_cold_start
+        self.cold_starts = {}
+        self.adaptive_result = None
+
+        # records are appended here as they complete instead of being held in memory;
+        # a resumed run keeps what is already there and skips the records it has
+        self.store = ResultStore(results_dir)
+        self.resume = resume
+        self._completed = set()
+
+        # cache hits skip the model entirely; None disables caching
+        self.cache = ResponseCache(cache_path) if cache_path else None
+        self._digests = {}
+        self._digest_lock = threading.Lock()
+
+    @traced()
     def run_benchmarks(self):
+        self._completed = self.store.completed_keys() if self.resume else set()
+        self.store.open(resume=self.resume)
+        if self.dispatcher is not None:
+            self._run_dispatched()
+        else:
+            self._run_single_host()
+
+        self.store.close()
+        self.sandbox.close()
+        self.scorer.close()
+        self.sampler.stop()
+        return self.store
+
+    @traced()
+    def run_adaptive(self, batch_size=8, confidence=0.95, margin=0.02, min_items=20,
+                     max_items=None, token_budget=None, time_budget=None, seed=0):
+        """
+        Runs every model on the same randomly ordered items, a batch at a time, and stops
+        as soon as the ranking is statistically settled (see SequentialComparison) or the
+        item, token (prompt + generated) or wall-time budget runs out. Records go to the
+        store as usual; the stopping summary ends up in `self.adaptive_result`.
+
+        Models take turns on each batch, so they all stay loaded for the whole run.
+        """
+        comparison = SequentialComparison(self.models, confidence, margin, min_items)
+        pool = shuffled_items(self.tasks, seed)
+        if max_items:
+            pool = pool[:max_items]
+
+        self.store.open()
+        for model in self.models:
+            self._prepare_model(model)
+
+        start = time.perf_counter()
+        used, tokens, reason = 0, 0, "items exhausted"
+        try:
+            for offset in range(0, len(pool), batch_size):
+                batch = pool[offset:offset + batch_size]
+                by_task = {}
+                for task_type, item in batch:
+                    by_task.setdefault(task_type, []).append(item)
+
+                for model in self.models:
+                    for task_type, items in by_task.items():
+                        for record in self._iter_task(model, task_type, items):
+                            self.store.append(model, task_type, record)
+                            comparison.add(model, task_type, record)
+                            tokens += (record.get("eval_count") or 0) + (record.get("prompt_eval_count") or 0)
+                used += len(batch)
+
+                comparison.look()
+                order, means = comparison.ranking()
+                print(f"🎯 {used}/{len(pool)} items: " + " > ".join(f"{m} ({means[m]:.3f})" for m in order))
+                if comparison.settled():
+                    reason = "ranking settled"
+                    break
+                if token_budget and tokens >= token_budget:
+                    reason = "token budget"
+                    break
+                if time_budget and time.perf_counter() - start >= time_budget:
+                    reason = "time budget"
+                    break
+        finally:
+            for model in self.models:
+                self._release_model(model)
+            self.store.close()
+            self.sandbox.close()
+            self.scorer.close()
+            self.sampler.stop()
+
+        order, means = comparison.ranking()
+        self.adaptive_result = {
+            "stopped": reason,
+            "items_used": used,
+            "items_available": len(pool),
+            "tokens_used": tokens,
+            "elapsed_sec": round(time.perf_counter() - start, 2),
+            "confidence": confidence,
+            "margin": margin,
+            "looks": comparison.looks,
+            "ranking": [{"model": m, "mean_score": means[m]} for m in order],
+            "pairs": comparison.intervals(),
+        }
+        print(f"🏁 Stopped after {used} of {len(pool)} items ({reason})")
+        return self.store
+
+    def _run_single_host(self):
         for model in self.models:
-            self.results[model] = {}
             print(f"\n\033[1mBenchmarking model: {model}\033[0m\n" + "="*50)
 
-            for task_type, task_data in self.tasks.items():
-                print(f"\n\033[1mRunning task: {task_type} ({len(task_data)} items)\033[0m")
-                task_results = self.benchmark_task(model, task_type, task_data)
-                self.results[model][task_type] = task_results
+            # load time and first-request effects go here, not into item 0 of the first task
+            self._prepare_model(model)
+
+            # one model at a time: all of its tasks run while it is pinned, then it is unloaded
+            try:
+                for task_type, task_data in self.tasks.items():
+                    # lazily loaded task sets don't know their size up front
+                    size = f" ({len(task_data)} items)" if hasattr(task_data, "__len__") else ""
+                    print(f"\n\033[1mRunning task: {task_type}{size}\033[0m")
+                    with span("benchmark_task", model=model, task=task_type):
+                        if self.pipeline:
+                            self._run_pipelined(model, task_type, task_data)
+                            continue
+                        for record in self._iter_task(model, task_type, task_data):
+                            self.store.append(model, task_type, record)
+            finally:
+                self._release_model(model)
+
+    def _run_pipelined(self, model, task_type, task_data):
+        self.sampler.start()
+        pipeline = Pipeline(
+            generate=lambda unit: self._run_item(model, task_type, unit, concurrent=True, defer_scoring=True),
+            score=lambda records: self._score_deferred(task_type, records),
+            sink=lambda record: self.store.append(model, task_type, record),
+            generate_workers=self.scheduler.max_workers if self.scheduler else 1,
+            score_workers=self.score_workers,
+            queue_size=self.queue_size,
+            score_batch_size=self.bert_batch_size,
+        )
+        stats = pipeline.run(self._task_units(model, task_type, task_data))
+        self.pipeline_stats[(model, task_type)] = stats
+
+        for stage in stats:
+            print(f"⚙️ {stage['stage']}: {stage['items']} items, {stage['throughput_per_sec']:.2f}/s, "
+                  f"{stage['utilization']:.0%} busy, queue depth max {stage['max_queue_depth']} "
+                  f"(mean {stage['mean_queue_depth']:.1f})")
+
+    def _run_dispatched(self):
+        for model in self.models:
+            for endpoint in self.dispatcher.endpoints_for(model):
+                print(f"\n\033[1mPreparing model: {model} on {endpoint.host}\033[0m")
+                self._prepare_model(model, endpoint.client, endpoint.host)
+
+        # every model is in use on every host until the last task, so they are all released at the end
+        try:
+            self._run_dispatched_tasks()
+        finally:
+            for model in self.models:
+                for endpoint in self.dispatcher.endpoints_for(model):
+                    self._release_model(model, endpoint.client)
+
+    def _run_dispatched_tasks(self):
+        for task_type, task_data in self.tasks.items():
+            print(f"\n\033[1mRunning task: {task_type} on {len(self.dispatcher.endpoints)} hosts\033[0m")
+            self.sampler.start()
+            defer_scoring = task_type in BATCH_SCORED_TASKS
+
+            def execute(endpoint, model, unit):
+                record = self._run_item(model, task_type, unit, concurrent=True,
+                                        defer_scoring=defer_scoring, client=endpoint.client)
+                return {**record, "model": model, "host": endpoint.host}
+
+            with span("benchmark_task", task=task_type, hosts=len(self.dispatcher.endpoints)):
+                # a generator: the dispatcher pulls units a window at a time, so lazy tasks stay lazy
+                units = ((model, unit) for model in self.models for unit in self._task_units(model, task_type, task_data))
+                records = self._dispatched_records(units, execute)
+                if defer_scoring:
+                    records = self._score_in_chunks(task_type, records)
+                for record in records:
+                    self.store.append(record["model"], task_type, record)
+
+        for host, stats in self.dispatcher.stats.items():
+            print(f"🖥️ {host}: {stats['completed']} completed, {stats['stolen']} stolen, {stats['failed']} failed attempts")
+
+    def _dispatched_records(self, units, execute):
+        for model, unit, result in self.dispatcher.run(units, execute):
+            if isinstance(result, Exception):
+                print(f"⚠️ {model} item {unit[0]} failed on every host: {result}")
+                continue
+            yield result
+
+    @traced()
+    def _prepare_model(self, model, client=None, host=None):
+        if self.measure_cold_start:
+            # per host: with several endpoints each one loads the model from its own disk
+            cold = self._measure_cold_start(model, client)
+            self.cold_starts[(model, host or self.host)] = cold
+            if cold["cold_start_sec"] is not None:
+                print(f"❄️ Cold start: {cold['cold_start_sec']:.2f} sec")
+
+        # cycle through the first prompt of each task so every template has been seen once
+        first_prompts = [
+            item["prompt"] for task_data in self.tasks.values() for item in itertools.islice(task_data, 1)
+        ]
+        for i in range(self.warmup if first_prompts else 0):
+            self._chat(model, first_prompts[i % len(first_prompts)], time.perf_counter(), client)
+
+    def _release_model(self, model, client=None):
+        if self.keep_alive is None:
+            return
+        try:
+            (client or self.client).generate(model=model, keep_alive=0)
+        except Exception as e:
+            print(f"⚠️ Could not unload {model}: {e}")
 
-                with open(f"results/{model}_{task_type}_results.json", "w", encoding="utf-8") as f:
-                    json.dump(task_results, f, indent=2)
+    def _measure_cold_start(self, model, client=None):
+        client = client or self.client
+        try:
+            # keep_alive=0 with no prompt unloads the model, an empty prompt loads it again
+            client.generate(model=model, keep_alive=0)
+            start_time = time.perf_counter()
+            reply = client.generate(model=model, keep_alive=self.keep_alive)
+            cold_start = time.perf_counter() - start_time
+        except Exception as e:
+            print(f"⚠️ Cold start measurement failed for {model}: {e}")
+            return {"cold_start_sec": None, "load_sec": None}
 
-        return self.results
+        load = reply.get("load_duration")
+        return {"cold_start_sec": round(cold_start, 4), "load_sec": round(load / 1e9, 4) if load else None}
 
     def benchmark_task(self, model, task_type, task_data):
-        task_results = []
+        with span("benchmark_task", model=model, task=task_type):
+            return list(self._iter_task(model, task_type, task_data))
 
-        for i, item in enumerate(task_data):
-            prompt = item["prompt"]
-            ground_truth = item["answer"]
+    def _iter_task(self, model, task_type, task_data):
+        defer_scoring = task_type in BATCH_SCORED_TASKS
 
-            start_time = time.time()
-            tracemalloc.start()
+        self.sampler.start()
+        units = self._task_units(model, task_type, task_data)
+
+        if self.scheduler is None:
+            records = (
+                self._run_item(model, task_type, unit, defer_scoring=defer_scoring)
+                for unit in units
+            )
+        else:
+            records = self.scheduler.map(
+                lambda unit: self._run_item(model, task_type, unit, concurrent=True,
+                                            defer_scoring=defer_scoring),
+                units
+            )
+
+        if defer_scoring:
+            records = self._score_in_chunks(task_type, records)
+        yield from records
+
+    def _task_units(self, model, task_type, task_data):
+        # every repetition is its own record, tagged with the item it came from;
+        # loaded items carry their position in the full dataset, which survives sharding
+        items = enumerate(task_data)
+        if self.order == "prefix":
+            items = prefix_order(items, self.prefix_window)
+        return (
+            (item.get("id", i), repetition, item)
+            for i, item in items
+            for repetition in range(self.repetitions)
+            if (model, task_type, item.get("id", i), repetition) not in self._completed
+        )
+
+    def _score_in_chunks(self, task_type, records):
+        # batch-scored tasks hold at most one chunk of unscored records
+        records = iter(records)
+        for chunk in iter(lambda: list(itertools.islice(records, self.bert_batch_size)), []):
+            self._score_deferred(task_type, chunk)
+            yield from chunk
+
+    def _score_deferred(self, task_type, task_results):
+        with span(f"evaluate_{task_type}", category="score", items=len(task_results)):
+            scores = self._batch_scores(task_type, task_results)
+
+        for r, score in zip(task_results, scores):
+            r["score"] = score
+            with self._print_lock:
+                self._display_interaction(r["prompt"], r["response"], score, r["latency"])
+
+    def _batch_scores(self, task_type, task_results):
+        if task_type not in BATCH_SCORED_TASKS:
+            return [self.evaluate(r["response"], r["ground_truth"], task_type) for r in task_results]
+
+        results = self.scorer.score(task_type, [(r["response"], r["ground_truth"]) for r in task_results])
+        # extra metrics (standard EM/F1 for QA) are kept next to the benchmark score
+        for r, result in zip(task_results, results):
+            r.update({k: v for k, v in result.items() if k != "score"})
+        return [result["score"] for result in results]
+
+    @traced()
+    def rescore(self, store=None):
+        """
+        Re-scores every record in a results store with the current scorers and rewrites
+        its metrics. Each task is scored in one batch, so only pairs the score cache
+        hasn't seen under the current scorer versions are computed, on every core.
+        """
+        store = store or self.store
+        results = store.load_metrics()
+        bodies = store.load_responses(
+            record_key(model, task_type, r)
+            for model, tasks in results.items() for task_type, records in tasks.items() for r in records
+        )
+
+        try:
+            for task_type in sorted({t for tasks in results.values() for t in tasks}):
+                # records whose bodies are missing (a run cut off mid-write) keep their old score
+                records = [
+                    (r, {**r, **bodies[record_key(model, task_type, r)]})
+                    for model, tasks in results.items() for r in tasks.get(task_type, [])
+                    if record_key(model, task_type, r) in bodies
+                ]
+                with span(f"evaluate_{task_type}", category="score", items=len(records)):
+                    scores = self._batch_scores(task_type, [merged for _, merged in records])
+                for (r, merged), score in zip(records, scores):
+                    r.update({k: v for k, v in merged.items() if k not in BODY_COLUMNS}, score=score)
+        finally:
+            self.sandbox.close()
+            self.scorer.close()
+
+        store.rewrite_metrics(results)
+        stats = self.scorer.stats
+        print(f"🧮 Scored {stats['pairs']} records: {stats['distinct']} distinct pairs, "
+              f"{stats['cached']} from the score cache, {stats['computed']} computed")
+        return store
+
+    def _run_item(self, model, task_type, unit, concurrent=False, defer_scoring=False, client=None):
+        item_id, repetition, item = unit
+        prompt = item["prompt"]
+        ground_truth = item["answer"]
+
+        generation = self._generate_cached(model, prompt, concurrent, repetition, client)
+        response = generation["response"]
+        latency = generation["latency"]
+
+        # BERTScore tasks are scored and displayed later, in one batch per task
+        score = None
+        if not defer_scoring:
+            score = self.evaluate(response, ground_truth, task_type)
+
+            with self._print_lock:
+                self._display_interaction(prompt, response, score, latency)
+
+        return {
+            "item_id": item_id,
+            "repetition": repetition,
+            "prompt": prompt,
+            # kept in the metrics file, where prompt-cache savings are estimated from it
+            "prompt_chars": len(prompt),
+            "ground_truth": ground_truth,
+            **generation,
+            "score": score
+        }
+
+    def _generate_cached(self, model, prompt, concurrent=False, repetition=0, client=None):
+        if self.cache is None:
+            return {**self._generate(model, prompt, concurrent, client), "cached": False}
+
+        digest = self._model_digest(model, client)
+        key = ResponseCache.make_key(model, digest, prompt, self.options, repetition, self.stream)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return {**hit, "cached": True}
+
+        generation = self._generate(model, prompt, concurrent, client)
+        self.cache.put(key, model, digest, generation)
+        return {**generation, "cached": False}
+
+    def _model_digest(self, model, client=None):
+        # the digest changes when a tag is re-pulled or re-quantized, which invalidates old entries;
+        # hosts can hold different builds of the same tag, so digests are looked up per client
+        client = client or self.client
+        key = (id(client), model)
+        with self._digest_lock:
+            if key not in self._digests:
+                digest = ""
+                try:
+                    for m in client.list()["models"]:
+                        if m["model"] in (model, f"{model}:latest"):
+                            digest = m["digest"]
+                            break
+                except Exception as e:
+                    print(f"⚠️ Could not read digest for {model}: {e}")
+                self._digests[key] = digest
+            return self._digests[key]
+
+    def model_digests(self):
+        """{model: digest} for the run history; "model@host" keys when several hosts serve a model."""
+        if self.dispatcher is None:
+            return {model: self._model_digest(model) for model in self.models}
+        return {
+            f"{model}@{endpoint.host}": self._model_digest(model, endpoint.client)
+            for model in self.models
+            for endpoint in self.dispatcher.endpoints_for(model)
+        }
+
+    def _generate(self, model, prompt, concurrent=False, client=None):
+        if concurrent:
+            # wait for a free slot before starting the clock so queueing isn't counted as latency;
+            # the dispatcher already caps requests per host (and passes that host's client), so it needs no slot
+            slot = self.scheduler.slot(model, self.host) if self.scheduler and client is None else nullcontext()
+            with slot:
+                start_time = time.perf_counter()
+                reply = self._chat(model, prompt, start_time, client)
+                end_time = time.perf_counter()
+        else:
+            start_time = time.perf_counter()
 
             self._thinking = True
             anim_thread = threading.Thread(target=self.thinking_animation)
             anim_thread.start()
 
-            response = ollama.chat(model=model, messages=[
-                {"role": "user", "content": prompt}
-            ])["message"]["content"]
+            reply = self._chat(model, prompt, start_time, client)
+            # stop the clock before joining the animation thread, which can sleep up to 0.1s
+            end_time = time.perf_counter()
 
             self._thinking = False
             anim_thread.join()
 
-            latency = time.time() - start_time
-            current, peak = tracemalloc.get_traced_memory()
-            tracemalloc.stop()
-
-            score = self.evaluate(response, ground_truth, task_type)
-
-            self._display_interaction(prompt, response, score, latency)
-
-            task_results.append({
-                "prompt": prompt,
-                "ground_truth": ground_truth,
-                "response": response,
-                "latency": latency,
-                "memory_kb": peak / 1024,
-                "score": score
-            })
-
-        return task_results
+        if get_tracer() is not None:
+            self._trace_generation(model, reply, start_time, end_time)
+
+        return {
+            **reply,
+            "latency": end_time - start_time,
+            **self.sampler.window(start_time, end_time),
+        }
+
+    def _trace_generation(self, model, reply, start_time, end_time):
+        tracer = get_tracer()
+        tracer.add("generate", start_time, end_time, "generate", {"model": model})
+        # the server's own load / prompt eval / decode split, laid end to end from the request start;
+        # Ollama reports durations, not timestamps, so placement inside the request is approximate
+        # and each phase is clipped to the measured request
+        cursor = start_time
+        for field, name in (("load_sec", "server_load"), ("prompt_eval_sec", "server_prompt_eval"), ("eval_sec", "server_decode")):
+            if reply.get(field) and cursor < end_time:
+                stop = min(cursor + reply[field], end_time)
+                tracer.add(name, cursor, stop, "server", {"model": model, "reported_sec": reply[field]})
+                cursor = stop
+
+    def _chat(self, model, prompt, start_time, client=None):
+        client = client or self.client
+        messages = [{"role": "user", "content": prompt}]
+
+        # characters shared with the previous prompt this server saw for the model, i.e. what its
+        # prompt cache could skip; approximate with several requests in flight on different slots
+        previous = self._last_prompts.get((id(client), model), "")
+        self._last_prompts[(id(client), model)] = prompt
+        prefix_chars = len(os.path.commonprefix([previous, prompt]))
+
+        if not self.stream:
+            final = client.chat(model=model, messages=messages, options=self.options, keep_alive=self.keep_alive)
+            return {"response": final["message"]["content"], "prompt_prefix_chars": prefix_chars,
+                    **self._server_timings(final)}
+
+        # perf_counter is monotonic, so chunk gaps can't go negative on a clock adjustment
+        pieces, stamps, final = [], [], {}
+        for chunk in client.chat(model=model, messages=messages, options=self.options, stream=True,
+                                 keep_alive=self.keep_alive):
+            now = time.perf_counter()
+            content = chunk["message"]["content"]
+            if content:
+                pieces.append(content)
+                stamps.append(now)
+            if chunk.get("done"):
+                final = chunk
+
+        gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+        return {
+            "response": "".join(pieces),
+            "ttft_sec": stamps[0] - start_time if stamps else None,
+            "inter_token_latency_sec": mean(gaps) if gaps else None,
+            "prompt_prefix_chars": prefix_chars,
+            **self._server_timings(final)
+        }
+
+    def _server_timings(self, final):
+        timings = {}
+        for field in OLLAMA_COUNT_FIELDS:
+            timings[field] = final.get(field)
+        for field in OLLAMA_DURATION_FIELDS:
+            value = final.get(field)
+            timings[field.replace("_duration", "_sec")] = value / 1e9 if value else None
+
+        # decode speed from the server's own counters, so network and client time don't skew it
+        if timings["eval_count"] and timings["eval_sec"]:
+            timings["decode_tokens_per_sec"] = timings["eval_count"] / timings["eval_sec"]
+        else:
+            timings["decode_tokens_per_sec"] = None
+        return timings
 
     #extension suggested in the notebook
     def thinking_animation(self):
@@ -86,14 +612,19 @@ class LLMBenchmark:
         sys.stdout.write('\r' + ' ' * 20 + '\r')
 
     def evaluate(self, response, ground_truth, task_type):
+        # code is case-sensitive (True/False, names), so it is checked before lowercasing;
+        # QA does its own normalisation and its answer can be a list of aliases
+        if task_type == "code":
+            return self.evaluate_code(response, ground_truth)
+        if task_type == "qa":
+            return self.evaluate_qa(response, ground_truth)
+        if task_type in TASK_SCORERS:
+            return TASK_SCORERS[task_type](response, ground_truth)
+
         response = response.strip().lower()
         ground_truth = ground_truth.strip().lower()
 
-        if task_type == "qa":
-            return self.evaluate_qa(response, ground_truth)
-        elif task_type == "code":
-            return self.evaluate_code(response, ground_truth)
-        elif task_type == "summarization":
+        if task_type == "summarization":
             return self.evaluate_summarization(response, ground_truth)
         elif task_type == "reasoning":
             return self.evaluate_reasoning(response, ground_truth)
@@ -105,28 +636,18 @@ class LLMBenchmark:
     #def evaluate_qa(self, response, ground_truth):
     #    return float(ground_truth in response or response in ground_truth or SequenceMatcher(None, response, ground_truth).ratio() > 0.9)
 
-    #QA V2
+    #QA V2 took containment, else max(token Jaccard, SequenceMatcher ratio); SequenceMatcher
+    #is worst-case quadratic on verbose answers, so V3 uses the batched scorers in lexical.py
+
+    #QA V3
+    @traced(category="score")
     def evaluate_qa(self, response, ground_truth):
-        response = response.strip().lower() #make sure they are in lowercase
-        ground_truth = ground_truth.strip().lower() #make sure they are in lowercase
-
-        if ground_truth in response or response in ground_truth:
-            return 1.0
-    
-        # token-level Jaccard similarity
-        response_tokens = set(response.split())
-        ground_truth_tokens = set(ground_truth.split())
-        intersection = response_tokens & ground_truth_tokens
-        union = response_tokens | ground_truth_tokens
-
-        jaccard_score = len(intersection) / len(union) if union else 0
-
-        # Or fuzzy string similarity
-        similarity_score = SequenceMatcher(None, response, ground_truth).ratio()
-
-        # Take the max of both
-        return max(jaccard_score, similarity_score) #in return two score are performed but the max score
-    
+        """
+        Containment of the normalised answer scores 1.0, otherwise max(token F1, edit similarity).
+        `ground_truth` may be a list of aliases; the best one counts.
+        """
+        return score_qa_batch([response], [ground_truth])["score"][0]
+
     #CODE V1
     #def evaluate_code(self, response, ground_truth):
         #norm_response = ''.join(response.split())
@@ -142,79 +663,45 @@ class LLMBenchmark:
         """
         Extracts the first code block from a response that may include markdown, text, and code.
         """
-        code_blocks = re.findall(r"```(?:python)?\n(.*?)```", response, re.DOTALL)
-        if code_blocks:
-            return code_blocks[0].strip()
-
-        # Fallback: extract lines starting from first function
-        lines = response.splitlines()
-        code_lines = []
-        in_code = False
-        for line in lines:
-            if line.strip().startswith("def "):
-                in_code = True
-            if in_code:
-                code_lines.append(line)
-        return "\n".join(code_lines).strip()
+        return extract_code(response)
 
+    @traced(category="score")
     def evaluate_code(self, response, ground_truth, func_name="func"):
         """
-        Evaluates code by functional execution if possible, otherwise falls back to AST similarity.
+        Evaluates code by calling it and the reference solution on the same generated inputs.
         """
-        response_code = self.extract_code(response)
-        ground_truth_code = ground_truth.strip()
+        return self.evaluate_code_batch([response], [ground_truth])[0]
 
-        # Try to execute the response code just to check for syntax/validity
-        try:
-            local_env = {}
-            exec(response_code, {}, local_env)
-            exec(ground_truth_code, {}, {})  # ground truth should be valid too
-            return 0.8 + 0.2 * self.ast_similarity(response_code, ground_truth_code)
-        except Exception:
-            return self.ast_similarity(response_code, ground_truth_code)
+    def evaluate_code_batch(self, responses, ground_truths):
+        """
+        Runs every response against its reference in the sandbox pool, in parallel.
+        Score is 0.8 * pass rate + 0.2 * AST similarity; code that can't be run
+        (syntax error, timeout, no function) only gets the AST part.
+        """
+        return [r["score"] for r in self.scorer.score("code", list(zip(responses, ground_truths)))]
 
     def ast_similarity(self, code1: str, code2: str) -> float:
-        try:
-            return SequenceMatcher(
-                None,
-                ast.dump(ast.parse(code1)),
-                ast.dump(ast.parse(code2))
-            ).ratio()
-        except:
-            return 0.0
+        return ast_similarity(code1, code2)
 
+    @traced(category="score")
     def evaluate_summarization(self, response, ground_truth):
         try:
-            P, R, F1 = bert_score([response], [ground_truth], lang="en", verbose=False)
-            return float(F1[0])
+            return bert_f1([response], [ground_truth])[0]
         except Exception as e:
             print(f"⚠️ BERTScore failed (summarization): {e}")
             return 0.0
 
+    @traced(category="score")
     def evaluate_reasoning(self, response, ground_truth):
         try:
-            P, R, F1 = bert_score([response], [ground_truth], lang="en", verbose=False)
-            return float(F1[0])
+            return bert_f1([response], [ground_truth])[0]
         except Exception as e:
             print(f"⚠️ BERTScore failed (reasoning): {e}")
             return 0.0
 
-    def get_summary_statistics(self):
-        summary = {}
-        for model, task_sets in self.results.items():
-            summary[model] = {}
-            for task_type, records in task_sets.items():
-                scores = [r["score"] for r in records]
-                latencies = [r["latency"] for r in records]
-                memory_usages = [r["memory_kb"] for r in records]
-
-                summary[model][task_type] = {
-                    "avg_score": round(mean(scores), 4),
-                    "avg_latency_sec": round(mean(latencies), 4),
-                    "avg_memory_kb": round(mean(memory_usages), 2),
-                }
-
-        return summary
+    def get_summary_statistics(self, results=None):
+        # reads the metrics columns from the store unless in-memory results are given
+        return summarize(results if results is not None else self.store, self.cold_starts, self.bootstrap_resamples)
 
     def _display_interaction(self, prompt, response, score=None, latency=None):
         divider = "-" * 50
@@ -225,4 +712,108 @@ class LLMBenchmark:
             print(f"\n\033[92mScore:\033[0m {score:.2f}")
         if latency is not None:
             print(f"\033[93mLatency:\033[0m {latency:.2f} sec")
-        print(f"\033[90m{divider}\033[0m")
\ No newline at end of file
+        print(f"\033[90m{divider}\033[0m")
+
+
+@traced()
+def summarize(all_results, cold_starts=None, bootstrap_resamples=1000):
+    """
+    Per model and task summary of stored results (a ResultStore or {model: {task: [records]}}).
+    Cold starts are measured outside the records, so they are passed in per (model, host).
+    Scores cover every record; timings and resource use only the ones measured in this
+    run (see measured_records), and each row says how many records were cache hits.
+    """
+    cold_starts = cold_starts or {}
+    summary = {}
+    for model, task_sets in load_results(all_results).items():
+        summary[model] = {}
+        for task_type, records in task_sets.items():
+            scores = [r["score"] for r in records]
+            measured = measured_records(records)
+            latencies = [r["latency"] for r in measured]
+            # server memory is unknown when the server isn't local or /proc is missing
+            rss_peaks = [r["server_rss_peak_kb"] for r in measured if r.get("server_rss_peak_kb") is not None]
+            cpu_means = [r["server_cpu_mean_pct"] for r in measured if r.get("server_cpu_mean_pct") is not None]
+            system_peaks = [r["system_mem_peak_kb"] for r in measured if r.get("system_mem_peak_kb") is not None]
+            cached = sum(1 for r in records if r.get("cached"))
+
+            summary[model][task_type] = {
+                "avg_score": round(mean(scores), 4),
+                "avg_latency_sec": round(mean(latencies), 4),
+                "avg_memory_kb": round(mean(rss_peaks), 2) if rss_peaks else None,
+                "peak_memory_kb": max(rss_peaks) if rss_peaks else None,
+                "avg_server_cpu_pct": round(mean(cpu_means), 2) if cpu_means else None,
+                "peak_system_mem_kb": max(system_peaks) if system_peaks else None,
+                "records": len(records),
+                "cached_records": cached,
+                # every record was a cache hit, so the timings are an earlier run's
+                "timings_from_cache": cached == len(records),
+            }
+
+            # tail latency and spread, plus bootstrap CIs on the two means
+            for stat, value in describe(latencies).items():
+                summary[model][task_type][f"{stat}_latency_sec"] = round(value, 4)
+            summary[model][task_type]["std_score"] = round(describe(scores).get("std", 0.0), 4)
+
+            for name, values in (("score", scores), ("latency_sec", latencies)):
+                low, high = bootstrap_ci(values, n_resamples=bootstrap_resamples)
+                summary[model][task_type][f"{name}_ci_low"] = round(low, 4)
+                summary[model][task_type][f"{name}_ci_high"] = round(high, 4)
+
+            # run-to-run noise: spread of each item's latency across its repetitions
+            by_item = {}
+            for r in measured:
+                by_item.setdefault(r.get("item_id"), []).append(r["latency"])
+            item_stds = [describe(v)["std"] for v in by_item.values() if len(v) > 1]
+            summary[model][task_type]["repetitions"] = max(len(v) for v in by_item.values())
+            summary[model][task_type]["avg_item_latency_std_sec"] = round(mean(item_stds), 4) if item_stds else None
+
+            # cold start is per model and host; repeated on each task row so it reaches the report.
+            # With several hosts the row gets the slowest one (the model is ready everywhere after
+            # it) and the per-host values next to it
+            cold = {host: c for (m, host), c in cold_starts.items() if m == model}
+            for key, summary_key in (("cold_start_sec", "cold_start_sec"), ("load_sec", "cold_load_sec")):
+                values = [c[key] for c in cold.values() if c.get(key) is not None]
+                summary[model][task_type][summary_key] = max(values) if values else None
+            if len(cold) > 1:
+                summary[model][task_type]["cold_start_by_host"] = cold
+
+            # streaming/server timings are missing for older cached records, so skip Nones
+            for metrics, rows in ((GENERATION_METRICS, measured), (SCORE_METRICS, records)):
+                for key, summary_key in metrics:
+                    values = [r[key] for r in rows if r.get(key) is not None]
+                    summary[model][task_type][summary_key] = round(mean(values), 4) if values else None
+
+            summary[model][task_type].update(prompt_cache_stats(measured))
+
+    return summary
+
+
+def prompt_cache_stats(records):
+    """
+    Estimated prompt-eval savings from the server's prompt cache.
+
+    Ollama's prompt_eval_count only counts the tokens it actually evaluated. Each record
+    notes how many leading characters its prompt shared with the previous prompt sent
+    to that model; the evaluated tokens per uncached character turn that shared prefix
+    into cached tokens, which are priced at the measured prompt-eval speed.
+    """
+    rows = [r for r in records if r.get("prompt_eval_count") is not None and r.get("prompt_chars")]
+    if not rows:
+        return {"prompt_tokens_evaluated": None, "prompt_tokens_est": None, "prompt_cache_hit_rate": None,
+                "prompt_eval_sec_total": None, "prompt_eval_saved_sec_est": None}
+
+    evaluated = sum(r["prompt_eval_count"] for r in rows)
+    shared_chars = sum(r.get("prompt_prefix_chars") or 0 for r in rows)
+    uncached_chars = sum(r["prompt_chars"] for r in rows) - shared_chars
+    eval_sec = sum(r.get("prompt_eval_sec") or 0.0 for r in rows)
+
+    cached = evaluated / uncached_chars * shared_chars if uncached_chars else 0.0
+    rate = evaluated / eval_sec if eval_sec else None
+    return {
+        "prompt_tokens_evaluated": evaluated,
+        "prompt_tokens_est": int(round(evaluated + cached)),
+        "prompt_cache_hit_rate": round(cached / (evaluated + cached), 4) if evaluated + cached else None,
+        "prompt_eval_sec_total": round(eval_sec, 4),
+        "prompt_eval_saved_sec_est": round(cached / rate, 4) if rate else None,
+    }
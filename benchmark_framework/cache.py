@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Persistent store of model generations, keyed by (model, model digest, prompt, options,
+    streaming).
+
+    Every generation is committed as soon as it finishes, so an interrupted run
+    picks up from the last completed item the next time it is started.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, digest, prompt, options=None, repetition=0, stream=False):
+        parts = [model, digest, prompt, options or {}]
+        # repeats need their own entries; the first one keeps the original key
+        if repetition:
+            parts.append(repetition)
+        # streamed payloads carry TTFT and inter-token timings that non-streamed ones lack
+        if stream:
+            parts.append("stream")
+        blob = json.dumps(parts, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, model, digest, payload):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model, digest, json.dumps(payload), time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,175 @@
+import queue
+import threading
+from collections import deque
+
+from benchmark_framework.backends import OllamaBackend
+
+
+class Endpoint:
+    """An Ollama server, the models it serves and how many requests it takes at once."""
+
+    def __init__(self, host, models, max_concurrency=1, client=None):
+        self.host = host
+        self.models = set(models)
+        self.max_concurrency = max_concurrency
+        self.client = client or OllamaBackend(host)
+
+    def __repr__(self):
+        return f"Endpoint({self.host!r}, {sorted(self.models)}, max_concurrency={self.max_concurrency})"
+
+
+def parse_endpoint(spec):
+    """Parses "host=model1,model2@4" (the @concurrency part is optional)."""
+    host, _, rest = spec.partition("=")
+    models, _, cap = rest.rpartition("@") if "@" in rest else (rest, "", "1")
+    return Endpoint(host, [m for m in models.split(",") if m], int(cap))
+
+
+class _Unit:
+    __slots__ = ("model", "payload", "attempts", "failed_hosts")
+
+    def __init__(self, model, payload):
+        self.model = model
+        self.payload = payload
+        self.attempts = 0
+        self.failed_hosts = set()
+
+
+class Dispatcher:
+    """
+    Spreads (model, payload) work units over several endpoints with work stealing.
+
+    Each endpoint gets its own queue and `max_concurrency` worker threads. Units are
+    dealt to the least-loaded endpoint serving their model; a worker whose queue is
+    empty steals from the back of the busiest other queue, taking only units for a
+    model its endpoint serves. A unit that raises is retried on a different endpoint
+    (when one serves the model) up to `max_attempts` times.
+
+    Units are pulled from the input a window at a time (twice the total concurrency by
+    default), so a lazily loaded task is never queued in memory whole.
+    """
+
+    def __init__(self, endpoints, max_attempts=3, window=None):
+        self.endpoints = list(endpoints)
+        self.max_attempts = max_attempts
+        self.window = window or 2 * sum(ep.max_concurrency for ep in self.endpoints)
+        self.stats = {ep.host: {"completed": 0, "stolen": 0, "failed": 0} for ep in self.endpoints}
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._outstanding = 0
+        self._exhausted = False
+
+    def endpoints_for(self, model):
+        return [ep for ep in self.endpoints if model in ep.models]
+
+    def _least_loaded(self, candidates):
+        return min(candidates, key=lambda ep: len(self._queues[ep.host]) / ep.max_concurrency)
+
+    def _take(self, endpoint):
+        own = self._queues[endpoint.host]
+        if own:
+            return own.popleft()
+
+        # steal from the tail of the longest queue, where the victim will get to last
+        for victim in sorted(self.endpoints, key=lambda ep: -len(self._queues[ep.host])):
+            stolen = self._queues[victim.host]
+            if victim is endpoint or not stolen:
+                continue
+            for i in range(len(stolen) - 1, -1, -1):
+                unit = stolen[i]
+                if unit.model in endpoint.models and endpoint.host not in unit.failed_hosts:
+                    del stolen[i]
+                    self.stats[endpoint.host]["stolen"] += 1
+                    return unit
+        return None
+
+    def run(self, units, execute):
+        """
+        Runs execute(endpoint, model, payload) for every (model, payload) in `units` and
+        yields (model, payload, result) as units finish. A unit that fails on every
+        attempt yields its last exception as the result instead.
+        """
+        units = iter(units)
+        with self._cond:
+            self._queues = {ep.host: deque() for ep in self.endpoints}
+            self._outstanding = 0
+            self._exhausted = False
+            pending = self._feed(units)
+
+        results = queue.Queue()
+        workers = [
+            threading.Thread(target=self._worker, args=(ep, execute, results), daemon=True)
+            for ep in self.endpoints
+            for _ in range(ep.max_concurrency)
+        ]
+        for w in workers:
+            w.start()
+
+        # fed but not yet yielded; once it hits 0 the input is exhausted, since _feed tops up after every result
+        while pending:
+            unit, result = results.get()
+            pending -= 1
+            yield unit.model, unit.payload, result
+            with self._cond:
+                pending += self._feed(units)
+
+        for w in workers:
+            w.join()
+
+    def _feed(self, units):
+        # called with the lock held: tops the queues up to `window` unfinished units, returns how many it added
+        added = 0
+        while not self._exhausted and self._outstanding < self.window:
+            try:
+                model, payload = next(units)
+            except StopIteration:
+                self._exhausted = True
+                break
+            serving = self.endpoints_for(model)
+            if not serving:
+                raise ValueError(f"No endpoint serves model '{model}'")
+            self._queues[self._least_loaded(serving).host].append(_Unit(model, payload))
+            self._outstanding += 1
+            added += 1
+        self._cond.notify_all()
+        return added
+
+    def _worker(self, endpoint, execute, results):
+        while True:
+            with self._cond:
+                unit = self._take(endpoint)
+                # nothing to do, but a unit still in flight elsewhere may fail and come back,
+                # or more units may still be fed in
+                while unit is None and (self._outstanding > 0 or not self._exhausted):
+                    self._cond.wait()
+                    unit = self._take(endpoint)
+                if unit is None:
+                    return
+
+            try:
+                result = execute(endpoint, unit.model, unit.payload)
+            except Exception as e:
+                with self._cond:
+                    unit.attempts += 1
+                    unit.failed_hosts.add(endpoint.host)
+                    self.stats[endpoint.host]["failed"] += 1
+                    if unit.attempts < self.max_attempts:
+                        serving = self.endpoints_for(unit.model)
+                        fresh = [ep for ep in serving if ep.host not in unit.failed_hosts]
+                        if not fresh:
+                            # every host has failed it once; start over rather than give up early
+                            unit.failed_hosts.clear()
+                            fresh = serving
+                        self._queues[self._least_loaded(fresh).host].append(unit)
+                        self._cond.notify_all()
+                        continue
+                    self._outstanding -= 1
+                    self._cond.notify_all()
+                results.put((unit, e))
+                continue
+
+            with self._cond:
+                self.stats[endpoint.host]["completed"] += 1
+                self._outstanding -= 1
+                self._cond.notify_all()
+            results.put((unit, result))
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from benchmark_framework.sandbox import generate_inputs
+from benchmark_framework.scoring import (SCORER_VERSIONS, ast_similarities, bert_f1, code_score, extract_code,
+                                         qa_scores)
+from benchmark_framework.tracing import span
+
+
+class ScoreCache:
+    """
+    Persistent store of scores, keyed by (task type, scorer version, response, ground truth).
+
+    A scorer whose output changes gets a new version in SCORER_VERSIONS, so its old
+    entries are simply never looked up again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " key TEXT PRIMARY KEY,"
+            " task TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(task_type, version, response, ground_truth):
+        blob = json.dumps([task_type, version, response, ground_truth], sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, payload FROM scores WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, json.loads(payload)) for key, payload in rows)
+        return found
+
+    def put_many(self, task_type, version, entries):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)",
+                [(key, task_type, version, json.dumps(payload), now) for key, payload in entries]
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ScoringService:
+    """
+    Scores (response, ground truth) pairs a batch at a time, computing each distinct pair once.
+
+    Identical pairs in a batch (models giving the same short answer, repetitions) are
+    scored once, and pairs scored before - in this run or an earlier one - come from the
+    ScoreCache. What's left is split by scorer: lexical QA metrics and AST similarity
+    run in a process pool, generated code runs in the sandbox workers, and BERTScore
+    stays in this process, where its model is loaded once and batched.
+
+    Batches under `min_parallel` distinct pairs are scored inline, where shipping them
+    to the pool would cost more than it saves.
+    """
+
+    def __init__(self, sandbox, cache_path=None, processes=None, bert_batch_size=64, min_parallel=32):
+        self.sandbox = sandbox
+        self.cache = ScoreCache(cache_path) if cache_path else None
+        self.processes = processes or os.cpu_count() or 1
+        self.bert_batch_size = bert_batch_size
+        self.min_parallel = min_parallel
+        self.stats = {"pairs": 0, "distinct": 0, "cached": 0, "computed": 0}
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def score(self, task_type, pairs):
+        """One result dict per pair, with "score" and any extra metrics the scorer reports."""
+        version = SCORER_VERSIONS.get(task_type)
+        if version is None:
+            return [{"score": 0.0} for _ in pairs]
+
+        keys = [ScoreCache.make_key(task_type, version, r, g) for r, g in pairs]
+        distinct = dict(zip(keys, pairs))
+        results = self.cache.get_many(distinct) if self.cache else {}
+        missing = [k for k in distinct if k not in results]
+
+        if missing:
+            with span(f"compute_{task_type}", category="score", pairs=len(missing)):
+                computed = self._compute(task_type, [distinct[k] for k in missing])
+            # failed or timed-out evaluations aren't memoized, so the next run retries them
+            fresh = [(k, result) for k, (result, ok) in zip(missing, computed) if ok]
+            if self.cache and fresh:
+                self.cache.put_many(task_type, version, fresh)
+            results.update((k, result) for k, (result, _) in zip(missing, computed))
+
+        with self._stats_lock:
+            self.stats["pairs"] += len(pairs)
+            self.stats["distinct"] += len(distinct)
+            self.stats["cached"] += len(distinct) - len(missing)
+            self.stats["computed"] += len(missing)
+        return [dict(results[k]) for k in keys]
+
+    def _compute(self, task_type, pairs):
+        # (result, memoizable) per pair
+        if task_type == "qa":
+            return [(result, True) for result in self._map(qa_scores, pairs)]
+        if task_type == "code":
+            return self._compute_code(pairs)
+
+        # same normalisation evaluate() applies before the per-item scorers
+        responses = [r.strip().lower() for r, _ in pairs]
+        ground_truths = [g.strip().lower() for _, g in pairs]
+        try:
+            scores = bert_f1(responses, ground_truths, batch_size=self.bert_batch_size)
+        except Exception as e:
+            print(f"⚠️ BERTScore failed ({task_type}): {e}")
+            return [({"score": 0.0}, False) for _ in pairs]
+        return [({"score": s}, True) for s in scores]
+
+    def _compute_code(self, pairs):
+        codes = [extract_code(r) for r, _ in pairs]
+        refs = [g.strip() for _, g in pairs]
+
+        # AST similarity runs in the pool while the sandbox executes the same code
+        similarities = self._submit(ast_similarities, list(zip(codes, refs)))
+        outcomes = self.sandbox.run_many([
+            {"candidate": code, "reference": ref, "inputs": generate_inputs(ref)}
+            for code, ref in zip(codes, refs)
+        ])
+        return [
+            ({"score": code_score(outcome, similarity)},
+             outcome["ok"] or not outcome.get("error", "").startswith(("timed out", "worker crashed")))
+            for outcome, similarity in zip(outcomes, similarities())
+        ]
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawned, not forked: the benchmark has generation and sampler threads running
+                self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=get_context("spawn"))
+            return self._pool
+
+    def _submit(self, fn, items):
+        """Starts fn over chunks of items; returns a callable that waits for the flattened results."""
+        if self.processes <= 1 or len(items) < self.min_parallel:
+            results = fn(items)
+            return lambda: results
+
+        # a few chunks per process so a slow chunk doesn't hold up the rest
+        size = -(-len(items) // (self.processes * 4))
+        futures = [self._get_pool().submit(fn, items[i:i + size]) for i in range(0, len(items), size)]
+        return lambda: [result for f in futures for result in f.result()]
+
+    def _map(self, fn, items):
+        return self._submit(fn, items)()
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
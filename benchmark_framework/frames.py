@@ -0,0 +1,53 @@
+import pandas as pd
+
+from benchmark_framework.store import load_results, measured_records
+
+
+def summary_frame(summary):
+    """
+    One row per (model, task) with every summary metric as a numeric column (missing
+    values become NaN), plus the efficiency columns. Built once and shared by the
+    report and the plots.
+    """
+    rows = {
+        (model, task): metrics
+        for model, tasks in summary.items()
+        for task, metrics in tasks.items()
+    }
+    if not rows:
+        # from_dict of nothing has no index levels to name
+        return pd.DataFrame(columns=['model', 'task', 'avg_score', 'avg_latency_sec', 'avg_memory_kb',
+                                     'efficiency_score_per_sec', 'efficiency_score_per_gb'])
+    df = pd.DataFrame.from_dict(rows, orient='index').rename_axis(['model', 'task']).reset_index()
+
+    # per-host cold starts are a {host: times} dict, only there for multi-host runs
+    metrics = [c for c in df.columns if c not in ('model', 'task', 'cold_start_by_host')]
+    df[metrics] = df[metrics].apply(pd.to_numeric)
+
+    # Efficiency: score per second and score per GB of model-server memory (NaN when not sampled)
+    df['efficiency_score_per_sec'] = df['avg_score'] / df['avg_latency_sec']
+    df['efficiency_score_per_gb'] = df['avg_score'] / (df['avg_memory_kb'] / 1024 ** 2)
+    return df
+
+
+def latency_frame(all_results):
+    """Per-record latencies as (model, task, latency) rows, for the distribution plots."""
+    return pd.DataFrame([
+        {"model": model, "task": task, "latency": r["latency"]}
+        for model, tasks in load_results(all_results).items()
+        for task, records in tasks.items()
+        for r in measured_records(records)
+    ], columns=["model", "task", "latency"])
+
+
+def regression_frame(regression):
+    """One row per (model, task, metric) comparison, with the change and its interval in percent of the base."""
+    df = pd.DataFrame(regression["changes"], columns=[
+        "model", "task", "metric", "items", "base_mean", "new_mean", "diff", "ci_low", "ci_high",
+        "change_pct", "p_value", "verdict",
+    ])
+    base = df["base_mean"].abs().where(df["base_mean"] != 0)
+    df["ci_low_pct"] = df["ci_low"] / base * 100
+    df["ci_high_pct"] = df["ci_high"] / base * 100
+    df["change_pct"] = pd.to_numeric(df["change_pct"])
+    return df
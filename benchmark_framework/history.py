@@ -0,0 +1,274 @@
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import threading
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+from benchmark_framework.store import load_results
+
+# per-item columns kept for every run; timing metrics from response-cache hits are copies
+# of an older generation, so comparisons leave those rows out for everything but score
+ITEM_COLUMNS = ("score", "latency", "ttft_sec", "decode_tokens_per_sec",
+                "eval_count", "prompt_eval_count", "prompt_eval_sec")
+TIMING_COLUMNS = {"latency", "ttft_sec", "decode_tokens_per_sec", "prompt_eval_sec"}
+
+# compared metric -> +1 when higher is better, -1 when lower is better
+COMPARED_METRICS = {
+    "score": 1,
+    "latency": -1,
+    "ttft_sec": -1,
+    "decode_tokens_per_sec": 1,
+}
+
+
+def git_commit(path="."):
+    """HEAD of the checkout at `path`, with "-dirty" when it has local changes; None outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True,
+                                text=True, timeout=5, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=path,
+                               capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def host_info():
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+
+
+class RunHistory:
+    """
+    SQLite history of benchmark runs: one row per run with its metadata (model digests,
+    host, options, git commit, summary) and one row per item with its metrics.
+
+    Items are keyed by (run, model, task, item, repetition) and indexed by
+    (model, task, item), so the same item can be looked up across runs without
+    scanning every run's rows.
+
+    With `read_only` an existing history is opened as is; a missing one is an error
+    rather than a new empty database.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if read_only:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No run history at {path}")
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " started_at REAL NOT NULL,"
+            " label TEXT,"
+            " git_commit TEXT,"
+            " host TEXT NOT NULL,"
+            " options TEXT NOT NULL,"
+            " digests TEXT NOT NULL,"
+            " summary TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS items ("
+            " run_id INTEGER NOT NULL REFERENCES runs(run_id),"
+            " model TEXT NOT NULL,"
+            " task TEXT NOT NULL,"
+            " item_id TEXT NOT NULL,"
+            " repetition INTEGER NOT NULL,"
+            " cached INTEGER NOT NULL,"
+            + "".join(f" {c} REAL," for c in ITEM_COLUMNS) +
+            " PRIMARY KEY (run_id, model, task, item_id, repetition)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS items_by_item ON items (model, task, item_id);"
+        )
+        self._conn.commit()
+
+    def record_run(self, results, summary, digests, options=None, label=None, commit=None, host=None):
+        """Stores a finished run (a ResultStore or in-memory results) and returns its run id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (started_at, label, git_commit, host, options, digests, summary)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), label, commit, json.dumps(host or host_info()), json.dumps(options or {}),
+                 json.dumps(digests), json.dumps(summary))
+            )
+            run_id = cursor.lastrowid
+            rows = (
+                (run_id, model, task, str(r.get("item_id")), r.get("repetition", 0), int(bool(r.get("cached"))),
+                 *(r.get(c) for c in ITEM_COLUMNS))
+                for model, tasks in load_results(results).items()
+                for task, records in tasks.items()
+                for r in records
+            )
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO items VALUES ({', '.join('?' * (6 + len(ITEM_COLUMNS)))})", rows
+            )
+            self._conn.commit()
+        return run_id
+
+    def runs(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id, started_at, label, git_commit, digests FROM runs ORDER BY run_id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {"run_id": r[0], "started_at": r[1], "label": r[2], "git_commit": r[3], "digests": json.loads(r[4])}
+            for r in rows
+        ]
+
+    def get_run(self, run_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, started_at, label, git_commit, host, options, digests FROM runs WHERE run_id = ?",
+                (run_id,)
+            ).fetchone()
+        if row is None:
+            raise ValueError(f"No run {run_id} in {self.path}")
+        keys = ("run_id", "started_at", "label", "git_commit", "host", "options", "digests")
+        run = dict(zip(keys, row))
+        for k in ("host", "options", "digests"):
+            run[k] = json.loads(run[k])
+        return run
+
+    def resolve(self, ref, before=None):
+        """A run id from "latest", "previous" (the run before `before`, or before the latest) or a number."""
+        with self._lock:
+            if ref == "latest":
+                row = self._conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+            elif ref == "previous":
+                row = self._conn.execute(
+                    "SELECT MAX(run_id) FROM runs WHERE run_id < COALESCE(?, (SELECT MAX(run_id) FROM runs))",
+                    (before,)
+                ).fetchone()
+            else:
+                try:
+                    run_id = int(ref)
+                except ValueError:
+                    raise ValueError(f"'{ref}' is not a run id, 'latest' or 'previous'")
+                row = self._conn.execute("SELECT run_id FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+                if row is None:
+                    raise ValueError(f"No run {run_id} in {self.path}")
+        if row[0] is None:
+            raise ValueError(f"No '{ref}' run in {self.path}")
+        return row[0]
+
+    def item_metrics(self, run_id):
+        """{(model, task, item_id): {metric: mean over repetitions}} for one run."""
+        columns = ", ".join(
+            f"AVG(CASE WHEN cached = 0 THEN {c} END)" if c in TIMING_COLUMNS else f"AVG({c})"
+            for c in COMPARED_METRICS
+        )
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT model, task, item_id, {columns} FROM items WHERE run_id = ? GROUP BY model, task, item_id",
+                (run_id,)
+            ).fetchall()
+        return {tuple(r[:3]): dict(zip(COMPARED_METRICS, r[3:])) for r in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def compare_runs(history, base_id, new_id, confidence=0.95, min_change=0.05):
+    """
+    Paired comparison of two runs on the items they share, per (model, task, metric).
+
+    Each item's metric is averaged over its repetitions, the per-item differences get a
+    normal-approximation test, and Holm-Bonferroni keeps the family-wise error at
+    1 - confidence across every comparison. A change is flagged only when it is both
+    significant and at least `min_change` (relative to the base mean), so tiny but
+    consistent shifts on large runs aren't reported as regressions.
+
+    Returns the two runs' commits, the models whose digest changed, and one row per
+    comparison with a "verdict" of regression, improvement or no change.
+    """
+    base, new = history.item_metrics(base_id), history.item_metrics(new_id)
+    cells = {}
+    for key in base.keys() & new.keys():
+        cells.setdefault(key[:2], []).append(key)
+
+    rows = []
+    for (model, task), keys in sorted(cells.items()):
+        for metric, better in COMPARED_METRICS.items():
+            pairs = np.array([(base[k][metric], new[k][metric]) for k in keys
+                              if base[k][metric] is not None and new[k][metric] is not None], dtype=float)
+            if len(pairs) < 2:
+                continue
+            diffs = pairs[:, 1] - pairs[:, 0]
+            base_mean, new_mean = pairs[:, 0].mean(), pairs[:, 1].mean()
+            se = diffs.std(ddof=1) / math.sqrt(len(diffs))
+            if se > 0:
+                p_value = 2 * (1 - NormalDist().cdf(abs(diffs.mean()) / se))
+            else:
+                p_value = 0.0 if diffs.mean() else 1.0
+            rows.append({
+                "model": model, "task": task, "metric": metric, "items": len(diffs),
+                "base_mean": float(base_mean), "new_mean": float(new_mean),
+                "diff": float(diffs.mean()), "se": float(se),
+                "change_pct": float(diffs.mean() / abs(base_mean) * 100) if base_mean else None,
+                "p_value": float(p_value),
+                "better": better,
+            })
+
+    # Holm-Bonferroni: walk the p-values upwards and stop at the first one that fails
+    alpha = 1 - confidence
+    z = NormalDist().inv_cdf(1 - alpha / (2 * max(len(rows), 1)))
+    rejecting = True
+    for rank, row in enumerate(sorted(rows, key=lambda r: r["p_value"])):
+        rejecting = rejecting and row["p_value"] <= alpha / (len(rows) - rank)
+        big_enough = row["change_pct"] is None or abs(row["change_pct"]) >= min_change * 100
+        row["significant"] = rejecting and big_enough
+        # Bonferroni-wide interval on the difference, for display
+        row["ci_low"], row["ci_high"] = row["diff"] - z * row["se"], row["diff"] + z * row["se"]
+        if not row["significant"]:
+            row["verdict"] = "no change"
+        elif row["diff"] * row["better"] > 0:
+            row["verdict"] = "improvement"
+        else:
+            row["verdict"] = "regression"
+
+    base_run, new_run = history.get_run(base_id), history.get_run(new_id)
+    return {
+        "base_run": base_id,
+        "new_run": new_id,
+        "base_commit": base_run["git_commit"],
+        "new_commit": new_run["git_commit"],
+        # models whose weights changed between the runs explain most score shifts
+        "changed_digests": sorted(
+            m for m in base_run["digests"].keys() & new_run["digests"].keys()
+            if base_run["digests"][m] != new_run["digests"][m]
+        ),
+        "confidence": confidence,
+        "min_change": min_change,
+        "changes": rows,
+    }
+
+
+def save_regression(comparison, results_dir="results"):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, "regression.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(comparison, f, indent=2)
+    return path
+
+
+def load_regression(results_dir="results"):
+    """The comparison against the previous run saved with the results, or None."""
+    path = os.path.join(results_dir, "regression.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,170 @@
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_framework.stats import describe
+from benchmark_framework.tracing import span
+
+
+def load_prompts(tasks, limit=None):
+    """Prompts from every task set, interleaved so each load level sees the same task mix."""
+    per_task = [[item["prompt"] for item in itertools.islice(task_data, limit)] for task_data in tasks.values()]
+    return [p for group in itertools.zip_longest(*per_task) for p in group if p is not None]
+
+
+class LoadTest:
+    """
+    Replays task prompts against a model at increasing load and records what the
+    server actually sustained at each level.
+
+    Closed loop (`run_closed`): `concurrency` workers each send their next request as
+    soon as the previous one returns, so the offered load adapts to the server.
+    Open loop (`run_open`): requests arrive as a Poisson process at `rate` per second
+    whatever the server does. Latency is measured from the scheduled arrival, so time
+    spent waiting behind a saturated server counts instead of being hidden.
+
+    Requests use the benchmark's generation `options` and `keep_alive`; with a
+    `keep_alive` set, each model is unloaded once its sweep is done. `host` labels the
+    results ("model@host") when several servers are swept one after another.
+    """
+
+    def __init__(self, client, prompts, options=None, requests_per_level=32, max_in_flight=256, seed=0,
+                 keep_alive=None, host=None):
+        if not prompts:
+            raise ValueError("Load test needs at least one prompt")
+        self.client = client
+        self.prompts = prompts
+        self.options = options or {}
+        self.requests_per_level = requests_per_level
+        self.max_in_flight = max_in_flight
+        self.seed = seed
+        self.keep_alive = keep_alive
+        self.host = host
+
+    def _timed(self, model, prompt, scheduled):
+        try:
+            reply = self.client.chat(model=model, messages=[{"role": "user", "content": prompt}], options=self.options,
+                                     keep_alive=self.keep_alive)
+        except Exception as e:
+            return {"ok": False, "latency": time.perf_counter() - scheduled, "tokens": 0, "error": str(e)}
+        return {"ok": True, "latency": time.perf_counter() - scheduled, "tokens": reply.get("eval_count") or 0}
+
+    def _summarize(self, model, mode, level, outcomes, wall):
+        ok = [o for o in outcomes if o["ok"]]
+        latencies = [o["latency"] for o in ok]
+        result = {
+            "model": f"{model}@{self.host}" if self.host else model,
+            "host": self.host,
+            "mode": mode,
+            "level": level,
+            "requests": len(outcomes),
+            "errors": len(outcomes) - len(ok),
+            "wall_sec": wall,
+            "rps": len(ok) / wall if wall else 0.0,
+            "tokens_per_sec": sum(o["tokens"] for o in ok) / wall if wall else 0.0,
+            "avg_latency_sec": sum(latencies) / len(latencies) if latencies else None,
+        }
+        result.update({f"{stat}_latency_sec": value for stat, value in describe(latencies).items()})
+        errors = [o["error"] for o in outcomes if not o["ok"]]
+        if errors:
+            result["first_error"] = errors[0]
+        return result
+
+    def run_closed(self, model, concurrency):
+        prompts = itertools.cycle(self.prompts)
+        lock = threading.Lock()
+        outcomes = []
+        sent = 0
+
+        def worker():
+            nonlocal sent
+            while True:
+                with lock:
+                    if sent >= self.requests_per_level:
+                        return
+                    sent += 1
+                    prompt = next(prompts)
+                outcome = self._timed(model, prompt, time.perf_counter())
+                with lock:
+                    outcomes.append(outcome)
+
+        with span("load_level", model=model, mode="closed", level=concurrency):
+            start = time.perf_counter()
+            threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - start
+        return self._summarize(model, "closed", concurrency, outcomes, wall)
+
+    def run_open(self, model, rate):
+        rng = random.Random(self.seed)
+        arrivals = list(itertools.accumulate(rng.expovariate(rate) for _ in range(self.requests_per_level)))
+
+        with span("load_level", model=model, mode="open", level=rate), \
+                ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            start = time.perf_counter()
+            futures = []
+            for offset, prompt in zip(arrivals, itertools.cycle(self.prompts)):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self._timed, model, prompt, start + offset))
+            outcomes = [f.result() for f in futures]
+            wall = time.perf_counter() - start
+        return self._summarize(model, "open", rate, outcomes, wall)
+
+    def sweep(self, models, concurrency_levels=(1, 2, 4, 8), rates=()):
+        """Closed-loop levels then open-loop rates for every model; returns one dict per level."""
+        results = []
+        for model in models:
+            print(f"\n\033[1mLoad test: {model}{f' on {self.host}' if self.host else ''}\033[0m")
+            # one unrecorded request so the first level doesn't pay the model load
+            self._timed(model, self.prompts[0], time.perf_counter())
+
+            runs = [(self.run_closed, c) for c in concurrency_levels] + [(self.run_open, r) for r in rates]
+            try:
+                for run, level in runs:
+                    result = run(model, level)
+                    results.append(result)
+                    label = f"concurrency {level}" if result["mode"] == "closed" else f"{level} req/s offered"
+                    if result["errors"] == result["requests"]:
+                        print(f"⚠️ {label}: every request failed ({result['first_error']})")
+                        continue
+                    print(f"📈 {label}: {result['rps']:.2f} req/s, {result['tokens_per_sec']:.1f} tok/s, "
+                          f"p95 {result['p95_latency_sec']:.2f}s, {result['errors']} errors")
+            finally:
+                self._release(model)
+        return results
+
+    def _release(self, model):
+        # same policy as the benchmark: a model kept loaded for the sweep is unloaded after it
+        if self.keep_alive is None:
+            return
+        try:
+            self.client.generate(model=model, keep_alive=0)
+        except Exception as e:
+            print(f"⚠️ Could not unload {model}: {e}")
+
+
+def load_capacity(results_dir="results"):
+    """Load-test levels saved by save_capacity, or None when no sweep was run."""
+    path = os.path.join(results_dir, "loadtest.jsonl")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_capacity(results, results_dir="results"):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, "loadtest.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    return path
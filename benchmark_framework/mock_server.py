@@ -0,0 +1,138 @@
+"""
+Local HTTP stand-in for the Ollama API, backed by a MockBackend.
+
+Serves /api/chat, /api/generate, /api/tags and /api/version closely enough for
+ollama.Client, so the whole harness - including multi-host dispatch - can run
+against it without a GPU:
+
+    python -m benchmark_framework.mock_server --port 11435 --models llama3:8b
+"""
+import argparse
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmark_framework.backends import MockBackend
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    backend = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, chunks):
+        # newline-delimited JSON over chunked encoding, like the real server
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            line = (json.dumps(chunk) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _stamp(self, chunk):
+        return {"created_at": datetime.now(timezone.utc).isoformat(), **chunk}
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(self.backend.list())
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-mock"})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        # the Ollama API streams unless told otherwise
+        stream = request.get("stream", True)
+        kwargs = {"stream": stream, "options": request.get("options"), "keep_alive": request.get("keep_alive")}
+
+        if self.path == "/api/chat":
+            reply = self.backend.chat(request["model"], request.get("messages", []), **kwargs)
+        elif self.path == "/api/generate":
+            reply = self.backend.generate(request["model"], request.get("prompt"), **kwargs)
+            reply = iter([reply]) if stream else reply
+        else:
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        if stream:
+            self._send_stream(self._stamp(chunk) for chunk in reply)
+        else:
+            self._send_json(self._stamp(reply))
+
+
+class MockOllamaServer:
+    """Runs the stand-in on a background thread; port=0 picks a free port."""
+
+    def __init__(self, backend=None, host="127.0.0.1", port=0):
+        handler = type("Handler", (_Handler,), {"backend": backend or MockBackend()})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock Ollama API for offline benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--models", default="mock", help="comma-separated model names to advertise")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean base latency per request (sec)")
+    parser.add_argument("--latency-dist", default="lognormal", choices=["fixed", "exponential", "lognormal"])
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier on every simulated delay")
+    parser.add_argument("--replay", default=None, help="JSONL of recorded responses (e.g. results/responses.jsonl)")
+    args = parser.parse_args()
+
+    backend = MockBackend(
+        latency_sec=args.latency,
+        latency_dist=args.latency_dist,
+        tokens_per_sec=args.tokens_per_sec,
+        time_scale=args.time_scale,
+        replay_path=args.replay,
+        models=args.models.split(","),
+    )
+    server = MockOllamaServer(backend, args.host, args.port)
+    print(f"Mock Ollama API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class StageStats:
+    """Items through a stage, time its workers spent busy, and how full its input queue got."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_sec = 0.0
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def record(self, items, busy_sec, queue_depth):
+        with self._lock:
+            self.items += items
+            self.busy_sec += busy_sec
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+            self._depth_total += queue_depth
+            self._depth_samples += 1
+
+    def as_dict(self, wall_sec):
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "throughput_per_sec": self.items / wall_sec if wall_sec else 0.0,
+            # share of the stage's worker capacity that was in use
+            "utilization": self.busy_sec / (wall_sec * self.workers) if wall_sec else 0.0,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_queue_depth": self._depth_total / self._depth_samples if self._depth_samples else 0.0,
+        }
+
+
+class Pipeline:
+    """
+    generate -> score -> sink, each stage on its own threads, joined by bounded queues.
+
+    `generate(item)` returns a record, `score(records)` scores a micro-batch of up to
+    `score_batch_size` records in place, and `sink(record)` runs on the calling thread.
+    Full queues block the stage before them, so a slow scorer throttles generation
+    instead of piling up responses in memory. Output order is completion order.
+    """
+
+    def __init__(self, generate, score, sink, generate_workers=1, score_workers=1,
+                 queue_size=64, score_batch_size=16):
+        self.generate = generate
+        self.score = score
+        self.sink = sink
+        self.score_batch_size = score_batch_size
+        self.inputs = queue.Queue(maxsize=queue_size)
+        self.generated = queue.Queue(maxsize=queue_size)
+        self.scored = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "generate": StageStats("generate", generate_workers),
+            "score": StageStats("score", score_workers),
+            "sink": StageStats("sink", 1),
+        }
+        self._error = None
+        self._stop = threading.Event()
+
+    def _fail(self, e):
+        if self._error is None:
+            self._error = e
+        self._stop.set()
+
+    def _feed(self, items):
+        try:
+            for item in items:
+                if self._stop.is_set():
+                    break
+                self.inputs.put(item)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(self.stats["generate"].workers):
+                self.inputs.put(_DONE)
+
+    def _generate_worker(self):
+        stats = self.stats["generate"]
+        while True:
+            item = self.inputs.get()
+            if item is _DONE:
+                return
+            if self._stop.is_set():
+                continue
+            depth = self.inputs.qsize()
+            start = time.perf_counter()
+            try:
+                record = self.generate(item)
+            except Exception as e:
+                self._fail(e)
+                continue
+            stats.record(1, time.perf_counter() - start, depth)
+            self.generated.put(record)
+
+    def _score_worker(self):
+        stats = self.stats["score"]
+        finished = False
+        while not finished:
+            first = self.generated.get()
+            if first is _DONE:
+                return
+            # micro-batch: whatever else is already waiting, up to the batch size
+            batch = [first]
+            while len(batch) < self.score_batch_size:
+                try:
+                    record = self.generated.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _DONE:
+                    finished = True
+                    break
+                batch.append(record)
+
+            if self._stop.is_set():
+                continue
+            depth = self.generated.qsize()
+            start = time.perf_counter()
+            try:
+                self.score(batch)
+            except Exception as e:
+                self._fail(e)
+                continue
+            stats.record(len(batch), time.perf_counter() - start, depth)
+            for record in batch:
+                self.scored.put(record)
+
+    def _close_after(self, threads, q, count):
+        for t in threads:
+            t.join()
+        for _ in range(count):
+            q.put(_DONE)
+
+    def run(self, items):
+        """Pushes every item through the pipeline; returns per-stage counters."""
+        start = time.perf_counter()
+        generators = [threading.Thread(target=self._generate_worker, daemon=True)
+                      for _ in range(self.stats["generate"].workers)]
+        scorers = [threading.Thread(target=self._score_worker, daemon=True)
+                   for _ in range(self.stats["score"].workers)]
+        helpers = [
+            threading.Thread(target=self._feed, args=(items,), daemon=True),
+            # each stage's workers get one end marker apiece once the stage before is done
+            threading.Thread(target=self._close_after, args=(generators, self.generated, len(scorers)), daemon=True),
+            threading.Thread(target=self._close_after, args=(scorers, self.scored, 1), daemon=True),
+        ]
+        for t in generators + scorers + helpers:
+            t.start()
+
+        sink_stats = self.stats["sink"]
+        while True:
+            record = self.scored.get()
+            if record is _DONE:
+                break
+            depth = self.scored.qsize()
+            t0 = time.perf_counter()
+            try:
+                self.sink(record)
+            except Exception as e:
+                self._fail(e)
+                continue
+            sink_stats.record(1, time.perf_counter() - t0, depth)
+
+        for t in helpers:
+            t.join()
+        if self._error is not None:
+            raise self._error
+
+        wall = time.perf_counter() - start
+        return [s.as_dict(wall) for s in self.stats.values()]
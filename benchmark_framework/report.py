@@ -1,21 +1,18 @@
 import os
 import pandas as pd
 import statistics
+from benchmark_framework.frames import summary_frame
+from benchmark_framework.store import ResultStore, load_results, record_key
+from benchmark_framework.tracing import get_tracer, traced
 
-def generate_report(summary, all_results, output_dir='results'):
+@traced()
+def generate_report(summary, all_results, output_dir='results', capacity=None, df=None, adaptive=None,
+                    regression=None):
     os.makedirs(output_dir, exist_ok=True)
     report_path = os.path.join(output_dir, "llm_benchmark_report.md")
 
-    df = pd.DataFrame.from_dict({
-        (model, task): metrics
-        for model, tasks in summary.items()
-        for task, metrics in tasks.items()
-    }, orient='index').reset_index()
-    df.columns = ['model', 'task', 'avg_score', 'avg_latency_sec', 'avg_memory_kb']
-
-    # Efficiency: score per second and score per KB
-    df['efficiency_score_per_sec'] = df['avg_score'] / df['avg_latency_sec']
-    df['efficiency_score_per_kb'] = df['avg_score'] / df['avg_memory_kb']
+    # the same frame create_visualizations draws from, when the caller already built it
+    df = summary_frame(summary) if df is None else df
 
     with open(report_path, "w", encoding="utf-8") as f:
         f.write("# LLM Benchmark Report\n\n")
@@ -28,26 +25,43 @@ def generate_report(summary, all_results, output_dir='results'):
         f.write(f"- **Best Performing Model**: `{best_model}` with an average score of **{best_score:.2f}**\n")
         f.write(f"- **Tasks Covered**: {df['task'].nunique()} — {', '.join(df['task'].unique())}\n")
         f.write(f"- **Efficiency (Score/sec)**: Top model is `{df.loc[df['efficiency_score_per_sec'].idxmax()]['model']}`\n")
-        f.write(f"- **Efficiency (Score/KB)**: Top model is `{df.loc[df['efficiency_score_per_kb'].idxmax()]['model']}`\n\n")
+        if df['efficiency_score_per_gb'].notna().any():
+            f.write(f"- **Efficiency (Score/GB)**: Top model is `{df.loc[df['efficiency_score_per_gb'].idxmax()]['model']}`\n\n")
+        else:
+            f.write("- **Efficiency (Score/GB)**: n/a — model server memory was not sampled\n\n")
 
         f.write("## Model Rankings\n")
         for model, score in top_models.items():
             f.write(f"- `{model}`: **{score:.2f}** average score\n")
+        write_adaptive(f, adaptive)
+        write_regressions(f, regression)
 
         f.write("\n## Task Performance\n")
         for task in df['task'].unique():
             f.write(f"### Task: `{task}`\n")
             task_df = df[df['task'] == task].sort_values(by='avg_score', ascending=False)
             for _, row in task_df.iterrows():
-                f.write(f"- `{row['model']}` → Score: **{row['avg_score']:.2f}**, Latency: {row['avg_latency_sec']:.2f}s, Memory: {row['avg_memory_kb']:.0f}KB\n")
+                f.write(f"- `{row['model']}` → Score: **{row['avg_score']:.2f}**, Latency: {row['avg_latency_sec']:.2f}s, Server memory: {_fmt(row['avg_memory_kb'] / 1024, '.0f', 'MB')}\n")
             f.write("\n")
 
         f.write("## Efficiency Metrics\n")
         for _, row in df.iterrows():
-            f.write(f"- `{row['model']} | {row['task']}` → Score/sec: **{row['efficiency_score_per_sec']:.2f}**, Score/KB: **{row['efficiency_score_per_kb']:.4f}**\n")
+            f.write(f"- `{row['model']} | {row['task']}` → Score/sec: **{row['efficiency_score_per_sec']:.2f}**, Score/GB: **{_fmt(row['efficiency_score_per_gb'], '.4f')}**\n")
+
+        write_qa_metrics(f, df)
+        write_response_cache(f, df)
+        write_latency_percentiles(f, df)
+        write_cold_start(f, df)
+        write_repetition_noise(f, df)
+        write_generation_speed(f, df)
+        write_prompt_cache(f, df)
+        write_capacity(f, capacity)
+        write_phase_breakdown(f, get_tracer())
 
         f.write("\n## Example Prompts and Responses\n")
-        for model, task_results in all_results.items():
+        # pick examples from the metrics first, then read only those bodies from the store
+        examples = {}
+        for model, task_results in load_results(all_results).items():
             for task_type, records in task_results.items():
                 if not records:
                     continue
@@ -55,16 +69,253 @@ def generate_report(summary, all_results, output_dir='results'):
                 median_idx = scores.index(sorted(scores)[len(scores) // 2])
                 best_idx = scores.index(max(scores))
                 worst_idx = scores.index(min(scores))
+                examples[(model, task_type)] = [
+                    (label, records[idx]) for label, idx in [("Best", best_idx), ("Median", median_idx), ("Worst", worst_idx)]
+                ]
+
+        bodies = {}
+        if isinstance(all_results, ResultStore):
+            bodies = all_results.load_responses(
+                record_key(model, task_type, r) for (model, task_type), picks in examples.items() for _, r in picks
+            )
+
+        for (model, task_type), picks in examples.items():
+            f.write(f"### `{model}` on `{task_type}`\n")
+            for label, metrics in picks:
+                r = {**metrics, **bodies.get(record_key(model, task_type, metrics), {})}
+                f.write(f"**{label} Example**\n")
+                f.write("```text\n")
+                f.write(f"Prompt:\n{r['prompt'].strip()}\n\n")
+                f.write(f"Response:\n{r['response'].strip()}\n\n")
+                expected = r['ground_truth'] if isinstance(r['ground_truth'], str) else " | ".join(r['ground_truth'])
+                f.write(f"Expected:\n{expected.strip()}\n")
+                f.write("```\n")
+                f.write(f"Score: **{r['score']:.2f}**, Latency: {r['latency']:.2f}s\n\n")
+
+    print(f"✅ Markdown report saved to {report_path}")
+
+
+def _fmt(value, spec, unit=""):
+    return f"{value:{spec}}{unit}" if pd.notna(value) else "n/a"
+
+
+def write_qa_metrics(f, df):
+    if 'avg_exact_match' not in df.columns:
+        return
+    qa = df.assign(avg_exact_match=pd.to_numeric(df['avg_exact_match']), avg_f1=pd.to_numeric(df['avg_f1']))
+    qa = qa[qa['avg_exact_match'].notna()]
+    if qa.empty:
+        return
+
+    f.write("\n## QA Exact Match / F1\n")
+    f.write("SQuAD-normalised, best alias per question.\n\n")
+    for _, row in qa.iterrows():
+        f.write(f"- `{row['model']} | {row['task']}` → EM: **{row['avg_exact_match']:.3f}**, F1: **{row['avg_f1']:.3f}**\n")
+
+
+def write_response_cache(f, df):
+    # only when some records were replayed from the response cache
+    if 'cached_records' not in df.columns or not (df['cached_records'] > 0).any():
+        return
+
+    f.write("\n## Response Cache Hits\n")
+    f.write("Cache hits replay a response and its timings from an earlier run. They count towards scores, but "
+            "latency, throughput and resource figures use only the requests measured in this run, unless every "
+            "request for that model and task was a hit.\n\n")
+    f.write("| Model | Task | Cache hits | Timings |\n")
+    f.write("|---|---|---|---|\n")
+    for _, row in df[df['cached_records'] > 0].iterrows():
+        timings = "**replayed from an earlier run**" if row['timings_from_cache'] else "measured requests only"
+        f.write(f"| `{row['model']}` | {row['task']} | {row['cached_records']:.0f}/{row['records']:.0f} | {timings} |\n")
+
+
+def write_latency_percentiles(f, df):
+    if 'p50_latency_sec' not in df.columns:
+        return
+
+    f.write("\n## Latency Percentiles\n")
+    f.write("| Model | Task | Min | p50 | p90 | p95 | p99 | Max | Std | Mean (95% CI) |\n")
+    f.write("|---|---|---|---|---|---|---|---|---|---|\n")
+    for _, row in df.iterrows():
+        cells = [_fmt(row[f'{c}_latency_sec'], '.2f', 's') for c in ('min', 'p50', 'p90', 'p95', 'p99', 'max', 'std')]
+        f.write(
+            f"| `{row['model']}` | {row['task']} | {' | '.join(cells)} "
+            f"| {row['avg_latency_sec']:.2f}s [{row['latency_sec_ci_low']:.2f}, {row['latency_sec_ci_high']:.2f}] |\n"
+        )
+
+    f.write("\n## Score Confidence\n")
+    f.write("| Model | Task | Mean score (95% CI) | Std |\n")
+    f.write("|---|---|---|---|\n")
+    for _, row in df.iterrows():
+        f.write(
+            f"| `{row['model']}` | {row['task']} "
+            f"| {row['avg_score']:.3f} [{row['score_ci_low']:.3f}, {row['score_ci_high']:.3f}] "
+            f"| {row['std_score']:.3f} |\n"
+        )
+
+
+def write_cold_start(f, df):
+    if 'cold_start_sec' not in df.columns:
+        return
+    per_model = df.groupby('model')[['cold_start_sec', 'cold_load_sec']].first().apply(pd.to_numeric)
+    if per_model['cold_start_sec'].isna().all():
+        return
+
+    by_host = df.groupby('model')['cold_start_by_host'].first() if 'cold_start_by_host' in df.columns else {}
+
+    f.write("\n## Cold Start\n")
+    f.write("Measured once per model and host by unloading it and timing an explicit preload; excluded from the task latencies above.\n\n")
+    for model, row in per_model.iterrows():
+        hosts = by_host.get(model)
+        if isinstance(hosts, dict):
+            for host, cold in hosts.items():
+                f.write(f"- `{model}` on {host} → Cold start: **{_fmt(cold.get('cold_start_sec'), '.2f', 's')}**, "
+                        f"Server load time: {_fmt(cold.get('load_sec'), '.2f', 's')}\n")
+        else:
+            f.write(f"- `{model}` → Cold start: **{_fmt(row['cold_start_sec'], '.2f', 's')}**, Server load time: {_fmt(row['cold_load_sec'], '.2f', 's')}\n")
+
+
+def write_repetition_noise(f, df):
+    if 'avg_item_latency_std_sec' not in df.columns:
+        return
+    noise = pd.to_numeric(df['avg_item_latency_std_sec'])
+    if noise.isna().all():
+        return
+
+    f.write("\n## Run-to-Run Noise\n")
+    for (_, row), std in zip(df.iterrows(), noise):
+        f.write(f"- `{row['model']} | {row['task']}` → {row['repetitions']} repetitions, mean per-item latency std: {_fmt(std, '.3f', 's')}\n")
+
+
+def write_adaptive(f, adaptive):
+    if not adaptive:
+        return
+
+    share = adaptive['items_used'] / adaptive['items_available'] if adaptive['items_available'] else 0
+    f.write("\n### Adaptive Sampling\n")
+    f.write(f"- Stopped after **{adaptive['items_used']} of {adaptive['items_available']} items** ({share:.0%}), "
+            f"reason: {adaptive['stopped']}; {adaptive['tokens_used']} tokens in {adaptive['elapsed_sec']:.1f}s\n")
+    f.write(f"- Intervals are {adaptive['confidence']:.0%} paired-difference intervals, corrected for "
+            f"{adaptive['looks']} interim looks; |difference| under {adaptive['margin']} counts as a tie\n\n")
+    f.write("| Pair | Items | Mean difference | Interval | Verdict |\n")
+    f.write("|---|---|---|---|---|\n")
+    for p in adaptive['pairs']:
+        f.write(f"| `{p['a']}` − `{p['b']}` | {p['items']} | {p['mean_diff']:+.3f} "
+                f"| [{p['ci_low']:+.3f}, {p['ci_high']:+.3f}] | {p['verdict']} |\n")
+
+
+def write_regressions(f, regression):
+    if not regression:
+        return
+    changes = regression['changes']
+    flagged = [c for c in changes if c['verdict'] != "no change"]
+
+    f.write(f"\n## Changes Since Run {regression['base_run']}\n")
+    f.write(f"- Run **{regression['new_run']}** (commit `{regression['new_commit'] or 'n/a'}`) against run "
+            f"**{regression['base_run']}** (commit `{regression['base_commit'] or 'n/a'}`), paired on the items both ran\n")
+    f.write(f"- Flagged when significant at {regression['confidence']:.0%} across all {len(changes)} comparisons "
+            f"(Holm-Bonferroni) and at least {regression['min_change']:.0%} from the base\n")
+    if regression['changed_digests']:
+        f.write(f"- Model weights changed: {', '.join(f'`{m}`' for m in regression['changed_digests'])}\n")
+    if not flagged:
+        f.write("- No significant regressions or improvements\n")
+        return
+
+    f.write("\n| Model | Task | Metric | Items | Base | New | Change | Verdict |\n")
+    f.write("|---|---|---|---|---|---|---|---|\n")
+    for c in sorted(flagged, key=lambda c: (c['verdict'] != "regression", c['model'], c['task'])):
+        f.write(f"| `{c['model']}` | {c['task']} | {c['metric']} | {c['items']} | {c['base_mean']:.3f} "
+                f"| {c['new_mean']:.3f} | {_fmt(c['change_pct'], '+.1f', '%')} | **{c['verdict']}** |\n")
+
+
+def generate_regression_report(regression, output_dir='results'):
+    """A report with just the comparison, for two runs picked from the history."""
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, "regression_report.md")
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("# LLM Benchmark Regression Report\n")
+        write_regressions(f, regression)
+        if os.path.exists(os.path.join(output_dir, "regression_diff.png")):
+            f.write("\n![Changes against the base run](regression_diff.png)\n")
+    print(f"✅ Regression report saved to {report_path}")
+    return report_path
+
+
+def write_prompt_cache(f, df):
+    if 'prompt_tokens_est' not in df.columns or df['prompt_tokens_est'].isna().all():
+        return
+
+    f.write("\n## Prompt Cache Reuse\n")
+    f.write("Prompts are ordered so shared template prefixes run back to back. Ollama counts only the prompt tokens it "
+            "evaluated, so full prompt sizes, hit rates and time saved are estimates.\n\n")
+    f.write("| Model | Task | Prompt tokens (est.) | Evaluated | Cache hit | Prompt eval time | Saved (est.) |\n")
+    f.write("|---|---|---|---|---|---|---|\n")
+    for _, row in df.iterrows():
+        f.write(
+            f"| `{row['model']}` | {row['task']} "
+            f"| {_fmt(row['prompt_tokens_est'], '.0f')} "
+            f"| {_fmt(row['prompt_tokens_evaluated'], '.0f')} "
+            f"| {_fmt(row['prompt_cache_hit_rate'], '.0%')} "
+            f"| {_fmt(row['prompt_eval_sec_total'], '.2f', 's')} "
+            f"| {_fmt(row['prompt_eval_saved_sec_est'], '.2f', 's')} |\n"
+        )
+
+
+def write_capacity(f, capacity):
+    if not capacity:
+        return
+    cap = pd.DataFrame(capacity)
+
+    f.write("\n## Capacity Under Load\n")
+    f.write("Prompts replayed from the task sets. Closed loop: N requests always in flight. "
+            "Open loop: Poisson arrivals at the offered rate, latency counted from the scheduled arrival.\n\n")
+    for model, model_df in cap.groupby('model', sort=False):
+        best = model_df.loc[model_df['rps'].idxmax()]
+        f.write(f"### `{model}`\n")
+        f.write(f"- **Peak throughput**: {best['rps']:.2f} req/s, {best['tokens_per_sec']:.1f} tok/s "
+                f"({'concurrency' if best['mode'] == 'closed' else 'offered rate'} {best['level']})\n\n")
+        f.write("| Mode | Level | Req/s | Tok/s | p50 | p90 | p95 | p99 | Errors |\n")
+        f.write("|---|---|---|---|---|---|---|---|---|\n")
+        for _, row in model_df.iterrows():
+            cells = [_fmt(row.get(f'p{p}_latency_sec'), '.2f', 's') for p in (50, 90, 95, 99)]
+            f.write(f"| {row['mode']} | {row['level']} | {row['rps']:.2f} | {row['tokens_per_sec']:.1f} "
+                    f"| {' | '.join(cells)} | {row['errors']}/{row['requests']} |\n")
+        f.write("\n")
+
+
+def write_phase_breakdown(f, tracer):
+    # only when the run was traced; the report's own span is still open, so it isn't listed
+    if tracer is None:
+        return
+    phases = tracer.phase_breakdown()
+    if not phases:
+        return
+
+    f.write("\n## Where the Time Went\n")
+    f.write("Summed over all threads, so overlapping or nested phases can add up to more than 100% of the run.\n\n")
+    f.write("| Phase | Count | Total | Mean | Share of run |\n")
+    f.write("|---|---|---|---|---|\n")
+    for name, p in phases.items():
+        f.write(f"| {name} | {p['count']} | {p['total_sec']:.2f}s | {p['mean_sec'] * 1000:.1f}ms | {p['share']:.0%} |\n")
+
+
+def write_generation_speed(f, df):
+    # only present when the server reported timings (or the run was streamed)
+    columns = ['avg_ttft_sec', 'avg_inter_token_latency_sec', 'avg_decode_tokens_per_sec',
+               'avg_prompt_eval_sec', 'avg_load_sec']
+    if not all(c in df.columns for c in columns) or df[columns].isna().all().all():
+        return
+    df = df.assign(**{c: pd.to_numeric(df[c]) for c in columns})
 
-                f.write(f"### `{model}` on `{task_type}`\n")
-                for label, idx in [("Best", best_idx), ("Median", median_idx), ("Worst", worst_idx)]:
-                    r = records[idx]
-                    f.write(f"**{label} Example**\n")
-                    f.write("```text\n")
-                    f.write(f"Prompt:\n{r['prompt'].strip()}\n\n")
-                    f.write(f"Response:\n{r['response'].strip()}\n\n")
-                    f.write(f"Expected:\n{r['ground_truth'].strip()}\n")
-                    f.write("```\n")
-                    f.write(f"Score: **{r['score']:.2f}**, Latency: {r['latency']:.2f}s\n\n")
-
-    print(f"✅ Markdown report saved to {report_path}")
\ No newline at end of file
+    f.write("\n## Generation Speed\n")
+    f.write("| Model | Task | TTFT | Inter-token | Decode tok/s | Prompt eval | Load |\n")
+    f.write("|---|---|---|---|---|---|---|\n")
+    for _, row in df.iterrows():
+        f.write(
+            f"| `{row['model']}` | {row['task']} "
+            f"| {_fmt(row['avg_ttft_sec'], '.3f', 's')} "
+            f"| {_fmt(row['avg_inter_token_latency_sec'] * 1000, '.1f', 'ms')} "
+            f"| {_fmt(row['avg_decode_tokens_per_sec'], '.1f')} "
+            f"| {_fmt(row['avg_prompt_eval_sec'], '.3f', 's')} "
+            f"| {_fmt(row['avg_load_sec'], '.3f', 's')} |\n"
+        )
\ No newline at end of file
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from collections import deque
+from statistics import mean
+
+PROC = "/proc"
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def find_pids(process_name):
+    pids = []
+    for entry in os.listdir(PROC):
+        if entry.isdigit() and process_name in _read(f"{PROC}/{entry}/comm"):
+            pids.append(int(entry))
+    return pids
+
+
+def process_rss_kb(pid):
+    for line in _read(f"{PROC}/{pid}/status").splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1])
+    return 0
+
+
+def process_cpu_ticks(pid):
+    stat = _read(f"{PROC}/{pid}/stat")
+    if not stat:
+        return 0
+    # comm can contain spaces, so split after its closing paren; utime/stime are fields 14 and 15
+    fields = stat.rsplit(")", 1)[1].split()
+    return int(fields[11]) + int(fields[12])
+
+
+def system_memory_used_kb():
+    info = {}
+    for line in _read(f"{PROC}/meminfo").splitlines():
+        key, value = line.split(":", 1)
+        info[key] = int(value.split()[0])
+    if "MemTotal" not in info:
+        return None
+    return info["MemTotal"] - info.get("MemAvailable", info.get("MemFree", 0))
+
+
+class ResourceSampler:
+    """
+    Background thread that polls the model server's RSS/CPU and system memory via /proc.
+
+    Samples are timestamped with perf_counter, so any (start, end) window timed with the
+    same clock - an item, a task - can be summarised afterwards with `window()`.
+    Requests in flight at the same time share the server, so their windows overlap.
+    """
+
+    def __init__(self, process_name="ollama", interval=0.1, max_samples=100_000):
+        self.process_name = process_name
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+        self.available = os.path.isdir(PROC)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if not self.available or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        ticks_per_sec = os.sysconf("SC_CLK_TCK")
+        pids, last_ticks, last_time = [], None, None
+        rescan_at = 0.0
+
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            # the server spawns a runner process per loaded model, so look for new pids now and then
+            if now >= rescan_at:
+                found = find_pids(self.process_name)
+                if found != pids:
+                    pids, last_ticks = found, None
+                rescan_at = now + 1.0
+
+            ticks = sum(process_cpu_ticks(p) for p in pids)
+            cpu_pct = None
+            if last_ticks is not None and now > last_time:
+                cpu_pct = 100.0 * (ticks - last_ticks) / ticks_per_sec / (now - last_time)
+            last_ticks, last_time = ticks, now
+
+            sample = (now, sum(process_rss_kb(p) for p in pids) if pids else None,
+                      cpu_pct, system_memory_used_kb())
+            with self._lock:
+                self.samples.append(sample)
+
+            self._stop.wait(self.interval)
+
+    def window(self, start, end):
+        """
+        Peak and mean of every metric sampled between start and end. A window shorter
+        than the interval falls back to the last sample taken before it ended.
+        """
+        inside = []
+        with self._lock:
+            # walk back from the newest sample; windows are almost always recent
+            for sample in reversed(self.samples):
+                if sample[0] > end:
+                    continue
+                if sample[0] < start:
+                    if not inside:
+                        inside.append(sample)
+                    break
+                inside.append(sample)
+
+        def column(i):
+            return [s[i] for s in inside if s[i] is not None]
+
+        rss, cpu, system = column(1), column(2), column(3)
+        return {
+            "server_rss_peak_kb": max(rss) if rss else None,
+            "server_rss_mean_kb": mean(rss) if rss else None,
+            "server_cpu_peak_pct": max(cpu) if cpu else None,
+            "server_cpu_mean_pct": mean(cpu) if cpu else None,
+            "system_mem_peak_kb": max(system) if system else None,
+        }
@@ -0,0 +1,140 @@
+import ast
+import atexit
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+# parameter names seen in data/code_benchmark.json, mapped to the kind of value they take
+STRING_PARAMS = {"s", "s1", "s2", "text", "string", "word", "sentence"}
+LIST_PARAMS = {"lst", "arr", "nums", "numbers", "items", "values", "l"}
+
+
+def _random_string(rng):
+    word = "".join(rng.choice("abcdeiouxyzAEIO") for _ in range(rng.randint(1, 8)))
+    # palindromes half the time, otherwise is_palindrome is always False
+    return word + word[::-1] if rng.random() < 0.5 else word
+
+
+def generate_inputs(reference_code, count=10, seed=0):
+    """
+    Builds argument lists for the first function in the reference solution, guessing
+    each parameter's type from its name. Seeded, so every model sees the same inputs.
+    """
+    try:
+        fn = next(n for n in ast.parse(reference_code).body if isinstance(n, ast.FunctionDef))
+    except (SyntaxError, StopIteration):
+        return []
+
+    params = [a.arg for a in fn.args.args]
+    rng = random.Random(seed)
+    inputs = []
+    for i in range(count):
+        args = []
+        for p in params:
+            if p in STRING_PARAMS:
+                # a shuffled copy of the previous string gives anagram checks a true case
+                if args and isinstance(args[-1], str) and rng.random() < 0.5:
+                    args.append("".join(rng.sample(args[-1], len(args[-1]))))
+                else:
+                    args.append(_random_string(rng))
+            elif p in LIST_PARAMS:
+                args.append([rng.randint(-5, 9) for _ in range(rng.randint(1, 8))])
+            else:
+                # small edge cases first, then random non-negative ints
+                args.append(i if i < 3 else rng.randint(0, 30))
+        inputs.append(args)
+    return inputs
+
+
+class _Worker:
+    def __init__(self, memory_mb):
+        self.proc = subprocess.Popen(
+            [sys.executable, "-I", WORKER_PATH, str(memory_mb)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8", bufsize=1
+        )
+        # a reader thread lets request() time out without select(), which Windows pipes lack
+        self.lines = queue.Queue()
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self):
+        for line in self.proc.stdout:
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def request(self, job, timeout):
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+        line = self.lines.get(timeout=timeout)
+        if line is None:
+            raise RuntimeError("worker exited")
+        return json.loads(line)
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+class CodeSandbox:
+    """
+    Pool of warm worker subprocesses that run model-generated code.
+
+    Workers fork a throwaway child per program (see sandbox_worker), so a job can't
+    leave anything behind for the next one. Each job has a wall-clock limit, enforced
+    by the worker, and each worker an address-space limit. A worker that doesn't answer
+    in time or dies is killed and replaced; healthy ones are kept for the next job.
+    """
+
+    def __init__(self, workers=4, timeout=10.0, memory_mb=512):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._idle = queue.Queue()
+        self._spawned = 0
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _checkout(self):
+        # workers are started lazily, so an unused sandbox costs nothing
+        with self._lock:
+            if self._idle.empty() and self._spawned < self.workers:
+                self._spawned += 1
+                return _Worker(self.memory_mb)
+        return self._idle.get()
+
+    def run(self, job):
+        worker = self._checkout()
+        try:
+            # the worker kills its own overrunning children; the grace covers a stuck worker
+            result = worker.request({**job, "timeout": self.timeout}, self.timeout + 2)
+        except queue.Empty:
+            result = {"ok": False, "error": f"timed out after {self.timeout}s"}
+        except (RuntimeError, OSError, ValueError) as e:
+            result = {"ok": False, "error": f"worker crashed: {e}"}
+        else:
+            # a worker without fork ran the model code itself and asks to be replaced
+            if not result.pop("retire", False):
+                self._idle.put(worker)
+                return result
+
+        worker.kill()
+        self._idle.put(_Worker(self.memory_mb))
+        return result
+
+    def run_many(self, jobs):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(self.run, jobs))
+
+    def close(self):
+        with self._lock:
+            while not self._idle.empty():
+                self._idle.get_nowait().kill()
+            self._spawned = 0
@@ -0,0 +1,188 @@
+"""
+Worker process for CodeSandbox.
+
+Reads one JSON job per line and writes one JSON result per line. Model code runs
+with stdin/stdout pointed at /dev/null so it can't corrupt the protocol stream.
+Only the standard library is used, since the worker is started with `python -I`.
+
+The worker itself never runs model code. It stays warm as a template and forks a
+child per program, so whatever a candidate does to the interpreter (rebinding
+json.dumps, patching builtins, this module) dies with its child. The child only
+reports reprs of its outputs; the comparison and the reply happen in the worker.
+"""
+import ast
+import copy
+import json
+import os
+import select
+import signal
+import sys
+import time
+
+
+def apply_limits(memory_mb):
+    try:
+        import resource
+    except ImportError:  # not available on Windows; only the wall-clock limit applies there
+        return
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def first_function(code):
+    for node in ast.parse(code).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return node.name
+    return None
+
+
+def call(fn, args):
+    try:
+        return True, fn(*copy.deepcopy(args))
+    except BaseException as e:
+        return False, type(e).__name__
+
+
+def same_output(a, b):
+    if a == b:
+        return True
+    # reference solutions like list(set(lst)) don't define an order
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        try:
+            return sorted(a) == sorted(b)
+        except TypeError:
+            return False
+    return False
+
+
+def run_program(code, name, inputs):
+    """Runs `name` (or the first function) from `code` on every input: (error, [(ok, repr of output)])."""
+    # one namespace per program, so recursive functions can find themselves
+    env = {}
+    try:
+        exec(code, env)
+        fn = env.get(name)
+        if not callable(fn):
+            fn = env.get(first_function(code))
+    except BaseException as e:
+        return f"{type(e).__name__}: {e}", []
+    if not callable(fn):
+        return "no function defined", []
+    outputs = []
+    for args in inputs:
+        ok, out = call(fn, args)
+        try:
+            outputs.append((ok, repr(out)))
+        except BaseException:
+            outputs.append((False, "unprintable output"))
+    return None, outputs
+
+
+def run_forked(code, name, inputs, deadline):
+    """run_program in a child that is thrown away afterwards; the result comes back as a literal."""
+    if not hasattr(os, "fork"):
+        # no fork on Windows: run here, and main() retires the worker after the job
+        return run_program(code, name, inputs)
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        # bound before the model code runs, so rebinding the module-level names can't reach them
+        write, exit_now, to_repr = os.write, os._exit, repr
+        try:
+            payload = to_repr(run_program(code, name, inputs)).encode("utf-8")
+            while payload:
+                payload = payload[write(write_fd, payload):]
+        finally:
+            exit_now(0)
+
+    os.close(write_fd)
+    chunks = []
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                os.kill(pid, signal.SIGKILL)
+                return "timed out", []
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+    try:
+        return ast.literal_eval(b"".join(chunks).decode("utf-8"))
+    except (ValueError, SyntaxError, UnicodeDecodeError, MemoryError):
+        return "program died without a result", []
+
+
+def parse_output(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        # not a literal (a custom object, say); fall back to comparing the reprs
+        return text
+
+
+def run_job(job):
+    timeout = job.get("timeout", 10.0)
+    deadline = time.monotonic() + timeout
+    name = first_function(job["reference"])
+
+    error, reference = run_forked(job["reference"], name, job["inputs"], deadline)
+    if error:
+        if error == "timed out":
+            return {"ok": False, "error": f"timed out after {timeout}s"}
+        return {"ok": False, "error": f"reference: {error}"}
+    error, candidate = run_forked(job["candidate"], name, job["inputs"], deadline)
+    if error:
+        if error == "timed out":
+            return {"ok": False, "error": f"timed out after {timeout}s"}
+        return {"ok": False, "error": error}
+
+    # only inputs the reference handles count; generated inputs can be the wrong type for
+    # parameters generate_inputs doesn't recognise, and matching its exception proves nothing
+    passed = total = 0
+    for (ref_ok, ref_out), (cand_ok, cand_out) in zip(reference, candidate):
+        if not ref_ok:
+            continue
+        total += 1
+        if cand_ok and same_output(parse_output(ref_out), parse_output(cand_out)):
+            passed += 1
+
+    if not total:
+        return {"ok": False, "error": "reference failed on every input"}
+    return {"ok": True, "passed": passed, "total": total}
+
+
+def main():
+    apply_limits(int(sys.argv[1]))
+
+    # keep private handles for the protocol and hide the real ones from model code
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    sys.stdin = open(os.devnull, "r")
+    sys.stdout = open(os.devnull, "w")
+
+    for line in requests:
+        try:
+            result = run_job(json.loads(line))
+        except BaseException as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        if not hasattr(os, "fork"):
+            # model code ran in this process, so it mustn't see another job
+            result["retire"] = True
+        replies.write(json.dumps(result) + "\n")
+        replies.flush()
+        if result.get("retire"):
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+
+class RequestScheduler:
+    """
+    Runs benchmark items on a bounded thread pool.
+
+    In-flight requests are capped per model and per server, and results are
+    handed back in the same order as the input items.
+    """
+
+    def __init__(self, max_workers=4, max_per_model=None, max_per_server=None):
+        self.max_workers = max_workers
+        self.max_per_model = max_per_model or max_workers
+        self.max_per_server = max_per_server or max_workers
+        self._lock = threading.Lock()
+        self._model_slots = {}
+        self._server_slots = {}
+
+    def _semaphore(self, table, key, limit):
+        with self._lock:
+            if key not in table:
+                table[key] = threading.BoundedSemaphore(limit)
+            return table[key]
+
+    @contextmanager
+    def slot(self, model, server):
+        """
+        Blocks until both the server and the model on it have a free request slot.
+        Latency should be measured inside this block so queueing time is not counted.
+        """
+        server_sem = self._semaphore(self._server_slots, server, self.max_per_server)
+        model_sem = self._semaphore(self._model_slots, (server, model), self.max_per_model)
+        # always server first, then model, so two threads can't deadlock on the pair
+        with server_sem, model_sem:
+            yield
+
+    def map(self, fn, items):
+        """
+        Applies fn to every item on the pool and yields the results in input order.
+        At most 2 * max_workers items are submitted ahead of the one being yielded, so
+        results come back while later items are still running, and a lazily loaded
+        task (see tasks.TaskSet) is only read a window at a time.
+        """
+        window = 2 * self.max_workers
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def prefix_order(indexed_items, window=256):
+    """
+    Re-orders (index, item) pairs so prompts sharing a prefix run back to back, letting
+    the server reuse the prompt (KV) cache left by the previous request. Items are sorted
+    within windows of `window`, so a lazily loaded task is never held in memory whole.
+    """
+    indexed_items = iter(indexed_items)
+    for chunk in iter(lambda: list(islice(indexed_items, window)), []):
+        chunk.sort(key=lambda entry: entry[1]["prompt"])
+        yield from chunk
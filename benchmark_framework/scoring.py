@@ -0,0 +1,99 @@
+import ast
+import re
+import threading
+from difflib import SequenceMatcher
+
+from benchmark_framework.lexical import score_qa_batch
+from benchmark_framework.tracing import span
+
+# tasks whose score comes from BERTScore and can be computed in batches
+BERT_SCORED_TASKS = {"summarization", "reasoning"}
+
+# tasks scored a chunk of records at a time rather than one record at a time
+BATCH_SCORED_TASKS = BERT_SCORED_TASKS | {"code", "qa"}
+
+# bumped whenever a scorer's output changes, so memoized scores from an older version are recomputed
+SCORER_VERSIONS = {
+    "qa": "qa-v3",
+    "code": "code-v3",
+    "summarization": "bertscore-roberta-large-f1",
+    "reasoning": "bertscore-roberta-large-f1",
+}
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_bert_scorer():
+    """
+    Returns the process-wide BERTScorer, building it on first use.
+    Same defaults as `bert_score.score(..., lang="en")`, so scores don't change.
+    """
+    global _scorer
+    with _scorer_lock:
+        if _scorer is None:
+            with span("bert_model_load", category="score"):
+                from bert_score import BERTScorer
+                _scorer = BERTScorer(lang="en")
+    return _scorer
+
+
+def bert_f1(candidates, references, batch_size=64):
+    """Scores every (candidate, reference) pair with the shared scorer and returns the F1 values."""
+    if not candidates:
+        return []
+    P, R, F1 = get_bert_scorer().score(candidates, references, batch_size=batch_size, verbose=False)
+    return [float(f) for f in F1]
+
+
+def extract_code(response):
+    """
+    Extracts the first code block from a response that may include markdown, text, and code.
+    """
+    code_blocks = re.findall(r"```(?:python)?\n(.*?)```", response, re.DOTALL)
+    if code_blocks:
+        return code_blocks[0].strip()
+
+    # Fallback: extract lines starting from first function
+    lines = response.splitlines()
+    code_lines = []
+    in_code = False
+    for line in lines:
+        if line.strip().startswith("def "):
+            in_code = True
+        if in_code:
+            code_lines.append(line)
+    return "\n".join(code_lines).strip()
+
+
+def ast_similarity(code1, code2):
+    try:
+        return SequenceMatcher(
+            None,
+            ast.dump(ast.parse(code1)),
+            ast.dump(ast.parse(code2))
+        ).ratio()
+    except:
+        return 0.0
+
+
+def code_score(outcome, similarity):
+    # 0.8 * pass rate + 0.2 * AST similarity; code that couldn't be run only gets the AST part
+    if outcome["ok"] and outcome["total"]:
+        return 0.8 * outcome["passed"] / outcome["total"] + 0.2 * similarity
+    return 0.2 * similarity
+
+
+# the CPU-bound scorers below take a list of (response, ground truth) pairs so a chunk of
+# them can be shipped to a worker process in one go
+
+def ast_similarities(pairs):
+    return [ast_similarity(code, ref) for code, ref in pairs]
+
+
+def qa_scores(pairs):
+    metrics = score_qa_batch([r for r, _ in pairs], [g for _, g in pairs])
+    return [
+        {"score": s, "exact_match": em, "f1": f1}
+        for s, em, f1 in zip(metrics["score"], metrics["exact_match"], metrics["f1"])
+    ]
@@ -0,0 +1,53 @@
+import numpy as np
+
+PERCENTILES = (50, 90, 95, 99)
+
+# upper bound on resampled values held in memory at once (~16 MB of float64)
+BOOTSTRAP_CHUNK = 2_000_000
+
+
+def describe(values):
+    """
+    Min/max, sample standard deviation and the PERCENTILES of `values`, ignoring NaNs.
+    Returns an empty dict when there is nothing to describe.
+    """
+    a = np.asarray(values, dtype=float)
+    a = a[~np.isnan(a)]
+    if a.size == 0:
+        return {}
+
+    stats = {
+        "min": float(a.min()),
+        "max": float(a.max()),
+        "std": float(a.std(ddof=1)) if a.size > 1 else 0.0,
+    }
+    for p, value in zip(PERCENTILES, np.percentile(a, PERCENTILES)):
+        stats[f"p{p}"] = float(value)
+    return stats
+
+
+def bootstrap_ci(values, n_resamples=1000, confidence=0.95, seed=0, statistic=np.mean):
+    """
+    Percentile-bootstrap confidence interval for `statistic` over `values`.
+
+    All resamples are drawn as one index matrix and reduced along axis 1; large inputs
+    are processed in row chunks so memory stays bounded by BOOTSTRAP_CHUNK.
+    """
+    a = np.asarray(values, dtype=float)
+    a = a[~np.isnan(a)]
+    if a.size == 0:
+        return None, None
+    if a.size == 1:
+        return float(a[0]), float(a[0])
+
+    rng = np.random.default_rng(seed)
+    estimates = np.empty(n_resamples)
+    rows = max(1, min(n_resamples, BOOTSTRAP_CHUNK // a.size))
+    for start in range(0, n_resamples, rows):
+        stop = min(start + rows, n_resamples)
+        idx = rng.integers(0, a.size, size=(stop - start, a.size))
+        estimates[start:stop] = statistic(a[idx], axis=1)
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(estimates, [alpha, 1 - alpha])
+    return float(low), float(high)
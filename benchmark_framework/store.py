@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+
+# identify a record across the two files
+KEY_COLUMNS = ("model", "task", "item_id", "repetition")
+
+# large text fields, kept out of the metrics file
+BODY_COLUMNS = ("prompt", "response", "ground_truth")
+
+
+def record_key(model, task, record):
+    return (model, task, record.get("item_id"), record.get("repetition", 0))
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class ResultStore:
+    """
+    Append-only results of a run, written one record at a time as items complete.
+
+    metrics.jsonl holds one compact line per record with the key and every numeric
+    column (latency, score, resource and timing metrics); responses.jsonl holds the
+    prompt/response/ground-truth bodies under the same key. Reports and plots read
+    only the metrics file, and either file is usable while the run is in progress.
+    """
+
+    def __init__(self, results_dir="results"):
+        self.results_dir = results_dir
+        self.metrics_path = os.path.join(results_dir, "metrics.jsonl")
+        self.responses_path = os.path.join(results_dir, "responses.jsonl")
+        self.summary_path = os.path.join(results_dir, "summary.json")
+        self._lock = threading.Lock()
+        self._metrics = None
+        self._responses = None
+
+    def open(self, resume=False):
+        """Starts writing; a fresh run truncates the previous one unless resume=True."""
+        os.makedirs(self.results_dir, exist_ok=True)
+        mode = "a" if resume else "w"
+        self._metrics = open(self.metrics_path, mode, encoding="utf-8")
+        self._responses = open(self.responses_path, mode, encoding="utf-8")
+        if resume:
+            # an interrupted run can leave a half-written last line; start on a fresh one
+            for f, path in ((self._metrics, self.metrics_path), (self._responses, self.responses_path)):
+                if f.tell() and not _ends_with_newline(path):
+                    f.write("\n")
+
+    def completed_keys(self):
+        """(model, task, item_id, repetition) of every record already in the metrics file."""
+        return {record_key(row["model"], row["task"], row) for row in self.iter_metrics()}
+
+    def append(self, model, task, record):
+        key = dict(zip(KEY_COLUMNS, record_key(model, task, record)))
+        metrics = {**key, **{k: v for k, v in record.items() if k not in BODY_COLUMNS and k not in key}}
+        bodies = {**key, **{k: record[k] for k in BODY_COLUMNS if k in record}}
+
+        with self._lock:
+            self._metrics.write(json.dumps(metrics, separators=(",", ":")) + "\n")
+            self._responses.write(json.dumps(bodies, separators=(",", ":")) + "\n")
+            # flushed per record so a crash or a reader mid-run sees everything completed so far
+            self._metrics.flush()
+            self._responses.flush()
+
+    def close(self):
+        with self._lock:
+            for f in (self._metrics, self._responses):
+                if f is not None:
+                    f.close()
+            self._metrics = self._responses = None
+
+    def iter_metrics(self):
+        if not os.path.exists(self.metrics_path):
+            return
+        with open(self.metrics_path, "r", encoding="utf-8") as f:
+            for line in f:
+                # the last line can be half-written while a run is still going
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def load_metrics(self):
+        """Metrics in the {model: {task: [records]}} shape get_summary_statistics expects."""
+        results = {}
+        for row in self.iter_metrics():
+            results.setdefault(row["model"], {}).setdefault(row["task"], []).append(row)
+        return results
+
+    def rewrite_metrics(self, results):
+        """Replaces the metrics file with {model: {task: [records]}}, e.g. after re-scoring."""
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for model, tasks in results.items():
+                for task, records in tasks.items():
+                    for record in records:
+                        key = dict(zip(KEY_COLUMNS, record_key(model, task, record)))
+                        row = {**key, **{k: v for k, v in record.items() if k not in BODY_COLUMNS and k not in key}}
+                        f.write(json.dumps(row, separators=(",", ":")) + "\n")
+        # readers never see a half-written file
+        os.replace(tmp_path, self.metrics_path)
+
+    def save_summary(self, summary):
+        os.makedirs(self.results_dir, exist_ok=True)
+        with open(self.summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    def load_summary(self, allow_stale=False):
+        """
+        The summary saved with the run, or None when there is none or the metrics were
+        appended to afterwards (a resumed run) and it has to be recomputed.
+        """
+        if not os.path.exists(self.summary_path):
+            return None
+        with open(self.summary_path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        if not allow_stale and os.path.exists(self.metrics_path) and \
+                os.path.getmtime(self.metrics_path) > os.path.getmtime(self.summary_path):
+            return None
+        return summary
+
+    def load_responses(self, keys):
+        """Bodies for just the requested (model, task, item_id, repetition) keys."""
+        wanted = set(keys)
+        found = {}
+        if not os.path.exists(self.responses_path):
+            return found
+        with open(self.responses_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = tuple(row.get(c) for c in KEY_COLUMNS)
+                if key in wanted:
+                    found[key] = row
+        return found
+
+
+def load_results(all_results):
+    """Accepts either a ResultStore or an in-memory {model: {task: [records]}} dict."""
+    if isinstance(all_results, ResultStore):
+        return all_results.load_metrics()
+    return all_results
+
+
+def measured_records(records):
+    """
+    The records whose timings were measured in this run. Response-cache hits replay an
+    earlier run's latency and server timings, so they are left out - unless every record
+    was a hit, in which case the replayed timings are all there is.
+    """
+    fresh = [r for r in records if not r.get("cached")]
+    return fresh or records
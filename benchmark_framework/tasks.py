@@ -1,70 +1,185 @@
 import json
 import os
+import random
+from itertools import islice
 
-def create_qa_benchmark(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        qa_data = json.load(f)
-
-    tasks = []
-    for item in qa_data:
-        prompt = f"Question: {item['question']}\nAnswer:"
-        tasks.append({
-            "prompt": prompt,
-            "answer": item["answer"],
-            "type": "qa"
-        })
+# task type -> (file stem inside the data dir, function turning one raw record into a task item)
+TASK_BUILDERS = {}
 
-    return tasks
+# task type -> score(response, ground_truth) for registered tasks the built-in scorers don't know
+TASK_SCORERS = {}
 
-def create_code_benchmark(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        code_data = json.load(f)
-
-    tasks = []
-    for item in code_data:
-        prompt = f"{item['prompt']}\n\nWrite your code below:\n"
-        tasks.append({
-            "prompt": prompt,
-            "answer": item["solution"],
-            "type": "code"
-        })
+# checked in this order when looking for a task's file
+DATA_EXTENSIONS = (".jsonl", ".parquet", ".json")
 
-    return tasks
 
-def create_summarization_benchmark(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        summarization_data = json.load(f)
-
-    tasks = []
-    for item in summarization_data:
-        prompt = f"Summarize the following text:\n\n{item['text']}\n\nSummary:"
-        tasks.append({
-            "prompt": prompt,
-            "answer": item["summary"],
-            "type": "summarization"
-        })
+def register_task(name, file_stem=None, scorer=None):
+    """
+    Registers `build(record) -> {"prompt", "answer", "type"}` for a task type, so
+    load_all_benchmarks picks it up from `<data_dir>/<file_stem>.<ext>`.
 
-    return tasks
+    Items whose "type" is one of the built-in tasks use that task's scorer. A new type
+    needs `scorer(response, ground_truth) -> float`; without one its items score 0.0.
+    Registered scorers run per record and aren't memoized in the score cache.
+    """
+    def decorator(build):
+        TASK_BUILDERS[name] = (file_stem or f"{name}_benchmark", build)
+        if scorer is not None:
+            TASK_SCORERS[name] = scorer
+        return build
+    return decorator
 
-def create_reasoning_benchmark(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        reasoning_data = json.load(f)
-
-    tasks = []
-    for item in reasoning_data:
-        prompt = f"Reason logically and answer the question:\n\n{item['question']}\nAnswer:"
-        tasks.append({
-            "prompt": prompt,
-            "answer": item["answer"],
-            "type": "reasoning"
-        })
 
-    return tasks
+def iter_records(file_path, batch_size=1024):
+    """
+    Yields raw records one at a time. JSONL and Parquet are streamed; a plain JSON
+    array has to be parsed whole, so convert big datasets to JSONL.
+    """
+    if file_path.endswith(".jsonl"):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif file_path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet task files requires pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+    else:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+
+def _reservoir(indexed_records, k, seed):
+    # O(k) memory however long the stream is; original order is restored afterwards
+    rng = random.Random(seed)
+    reservoir = []
+    for n, entry in enumerate(indexed_records):
+        if n < k:
+            reservoir.append(entry)
+        else:
+            j = rng.randint(0, n)
+            if j < k:
+                reservoir[j] = entry
+    return sorted(reservoir, key=lambda entry: entry[0])
+
+
+class TaskSet:
+    """
+    Lazily loaded items of one task. Nothing is read until iteration and each pass
+    re-reads the file, so memory stays flat no matter how large the dataset is.
+
+    Items get an "id" with their position in the full file, so shards and samples
+    of the same dataset can be lined up afterwards.
+    """
+
+    def __init__(self, name, file_path, build, limit=None, shard=None, sample=None, seed=0):
+        self.name = name
+        self.file_path = file_path
+        self.build = build
+        self.limit = limit
+        self.shard = shard
+        self.sample = sample
+        self.seed = seed
+
+    def __iter__(self):
+        records = enumerate(iter_records(self.file_path))
+        if self.shard:
+            index, count = self.shard
+            records = ((i, r) for i, r in records if i % count == index)
+        if self.sample:
+            records = iter(_reservoir(records, self.sample, self.seed))
+        if self.limit:
+            records = islice(records, self.limit)
+
+        for i, record in records:
+            task = self.build(record)
+            task["id"] = i
+            yield task
+
+    def __repr__(self):
+        return f"TaskSet({self.name!r}, {self.file_path!r})"
+
+
+@register_task("qa")
+def build_qa_item(item):
+    # TriviaQA-style records carry accepted aliases, either next to the answer
+    # or inside it as {"value": ..., "aliases": [...]}; those become a list of answers
+    answer = item["answer"]
+    if isinstance(answer, dict):
+        answer = [answer["value"]] + [a for a in answer.get("aliases", []) if a != answer["value"]]
+    elif item.get("aliases"):
+        answer = [answer] + [a for a in item["aliases"] if a != answer]
+    return {
+        "prompt": f"Question: {item['question']}\nAnswer:",
+        "answer": answer,
+        "type": "qa"
+    }
+
 
-def load_all_benchmarks(data_dir):
+@register_task("code")
+def build_code_item(item):
     return {
-        "qa": create_qa_benchmark(os.path.join(data_dir, "qa_benchmark.json")),
-        "code": create_code_benchmark(os.path.join(data_dir, "code_benchmark.json")),
-        "summarization": create_summarization_benchmark(os.path.join(data_dir, "summarization_benchmark.json")),
-        "reasoning": create_reasoning_benchmark(os.path.join(data_dir, "reasoning_benchmark.json"))
+        "prompt": f"{item['prompt']}\n\nWrite your code below:\n",
+        "answer": item["solution"],
+        "type": "code"
     }
+
+
+@register_task("summarization")
+def build_summarization_item(item):
+    return {
+        "prompt": f"Summarize the following text:\n\n{item['text']}\n\nSummary:",
+        "answer": item["summary"],
+        "type": "summarization"
+    }
+
+
+@register_task("reasoning")
+def build_reasoning_item(item):
+    return {
+        "prompt": f"Reason logically and answer the question:\n\n{item['question']}\nAnswer:",
+        "answer": item["answer"],
+        "type": "reasoning"
+    }
+
+
+def create_qa_benchmark(file_path):
+    return [build_qa_item(item) for item in iter_records(file_path)]
+
+def create_code_benchmark(file_path):
+    return [build_code_item(item) for item in iter_records(file_path)]
+
+def create_summarization_benchmark(file_path):
+    return [build_summarization_item(item) for item in iter_records(file_path)]
+
+def create_reasoning_benchmark(file_path):
+    return [build_reasoning_item(item) for item in iter_records(file_path)]
+
+
+def find_task_file(data_dir, file_stem):
+    for ext in DATA_EXTENSIONS:
+        path = os.path.join(data_dir, file_stem + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_all_benchmarks(data_dir, task_names=None, limit=None, shard=None, sample=None, seed=0):
+    """
+    Returns {task type: TaskSet} for every registered task (or just `task_names`)
+    that has a data file. shard=(i, n) keeps every n-th record starting at i,
+    sample=k keeps a seeded random k records, limit caps what is left.
+    """
+    tasks = {}
+    for name, (file_stem, build) in TASK_BUILDERS.items():
+        if task_names and name not in task_names:
+            continue
+        path = find_task_file(data_dir, file_stem)
+        if path is None:
+            print(f"⚠️ No data file for task '{name}' ({file_stem}.jsonl/.parquet/.json) in {data_dir}")
+            continue
+        tasks[name] = TaskSet(name, path, build, limit=limit, shard=shard, sample=sample, seed=seed)
+    return tasks
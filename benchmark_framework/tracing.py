@@ -0,0 +1,193 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# the active Tracer, or None; spans cost one global lookup while tracing is off
+_tracer = None
+_NO_SPAN = nullcontext()
+
+
+class Tracer:
+    """
+    Collects timed spans from every thread as Chrome trace "complete" events,
+    which chrome://tracing and ui.perfetto.dev open directly.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self._thread_names = {}
+
+    def add(self, name, start, end, category="phase", args=None):
+        """Records a span from perf_counter() timestamps; list.append is atomic, so no lock."""
+        tid = threading.get_ident()
+        if tid not in self._thread_names:
+            self._thread_names[tid] = threading.current_thread().name
+        self.events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self.origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self.pid,
+            "tid": tid,
+            "args": args or {},
+        })
+
+    @contextmanager
+    def span(self, name, category="phase", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter(), category, args)
+
+    def phase_breakdown(self):
+        """
+        {span name: {"count", "total_sec", "mean_sec", "share"}}, largest total first.
+        Spans nest and overlap across threads, so shares of the traced wall time can sum past 1.
+        """
+        events = list(self.events)
+        if not events:
+            return {}
+        wall = (max(e["ts"] + e["dur"] for e in events) - min(e["ts"] for e in events)) / 1e6
+
+        totals = defaultdict(lambda: [0, 0.0])
+        for e in events:
+            totals[e["name"]][0] += 1
+            totals[e["name"]][1] += e["dur"] / 1e6
+
+        return {
+            name: {
+                "count": count,
+                "total_sec": total,
+                "mean_sec": total / count,
+                "share": total / wall if wall else 0.0,
+            }
+            for name, (count, total) in sorted(totals.items(), key=lambda kv: -kv[1][1])
+        }
+
+    def export_chrome_trace(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        names = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self._thread_names.items()
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": names + list(self.events), "displayTimeUnit": "ms"}, f)
+        print(f"✅ Trace saved to {path} (open in ui.perfetto.dev or chrome://tracing)")
+
+
+def enable():
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, category="phase", **args):
+    """`with span("name"):` records a span while tracing is enabled and does nothing otherwise."""
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, category, **args)
+
+
+def traced(name=None, category="phase"):
+    """Decorator form of span(), named after the function unless `name` is given."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with _tracer.span(span_name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler:
+    """
+    Opt-in profiling next to the trace.
+
+    mode="cprofile" runs cProfile on the calling thread (deterministic, but it only
+    sees that thread) and writes profile.prof plus a top-functions text summary.
+    mode="sample" is a py-spy-style sampler: a background thread reads every thread's
+    stack each `interval` seconds and writes them as collapsed stacks (profile_stacks.txt)
+    for flamegraph.pl or speedscope. Its cost depends on the interval, not on the code.
+    """
+
+    def __init__(self, mode="sample", interval=0.005):
+        if mode not in ("cprofile", "sample"):
+            raise ValueError(f"Unknown profiler mode '{mode}' (use 'cprofile' or 'sample')")
+        self.mode = mode
+        self.interval = interval
+        self.stacks = Counter()
+        self._profile = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self, results_dir="results", top=30):
+        os.makedirs(results_dir, exist_ok=True)
+        if self.mode == "cprofile":
+            self._profile.dump_stats(os.path.join(results_dir, "profile.prof"))
+            path = os.path.join(results_dir, "profile.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                pstats.Stats(self._profile, stream=f).sort_stats("cumulative").print_stats(top)
+        else:
+            path = os.path.join(results_dir, "profile_stacks.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        print(f"✅ Profile saved to {path}")
+        return path
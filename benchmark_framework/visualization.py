@@ -1,10 +1,25 @@
+import hashlib
+import inspect
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
+
+from benchmark_framework.frames import latency_frame, regression_frame, summary_frame
+from benchmark_framework.tracing import traced
+
+# pyplot and seaborn are imported inside the plotting functions, so importing this module
+# (and a report-only run whose figures are all up to date) never pays for them
+
+# figure file -> hash of the inputs it was last drawn from
+MANIFEST_FILE = ".figures.json"
 
 def set_plotting_style():
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     sns.set(style="whitegrid")
     plt.rcParams.update({
         'axes.titlesize': 14,
@@ -15,27 +30,119 @@ def set_plotting_style():
         'figure.titlesize': 16
     })
 
-def create_visualizations(summary, results_dir='results'):
-    os.makedirs(results_dir, exist_ok=True)
+def _init_worker():
+    # headless: the figures only ever go to files
+    import matplotlib
+    matplotlib.use("Agg")
     set_plotting_style()
 
-    df = pd.DataFrame.from_dict({
-        (model, task): metrics
-        for model, tasks in summary.items()
-        for task, metrics in tasks.items()
-    }, orient='index').reset_index()
-    df.columns = ['model', 'task', 'avg_score', 'avg_latency_sec', 'avg_memory_kb']
-
-    # Create and save plots
-    create_bar_chart(df, 'avg_score', 'Model Accuracy by Task', results_dir)
-    create_bar_chart(df, 'avg_latency_sec', 'Model Latency (sec) by Task', results_dir)
-    create_bar_chart(df, 'avg_memory_kb', 'Model Memory Usage (KB) by Task', results_dir)
-    create_performance_vs_latency_scatter(df, results_dir)
-    create_performance_dashboard(df, results_dir)
-    create_enhanced_radar_chart(df, results_dir)
-    create_enhanced_heatmap(summary, results_dir)
+def figure_jobs(df, results_dir, latencies=None, capacity=None, regression=None):
+    """
+    (output files, plot function, inputs) for every figure. Each job gets only the
+    columns it draws, so a change elsewhere in the summary doesn't invalidate it.
+    """
+    keys = ['model', 'task']
+    jobs = [
+        (["avg_score_bar_chart.png"], create_bar_chart, (df[keys + ['avg_score']], 'avg_score', 'Model Accuracy by Task')),
+        (["avg_latency_sec_bar_chart.png"], create_bar_chart, (df[keys + ['avg_latency_sec']], 'avg_latency_sec', 'Model Latency (sec) by Task')),
+    ]
+    # server memory is missing when the model server isn't local, so leave that chart out
+    if df['avg_memory_kb'].notna().any():
+        jobs.append((["avg_memory_kb_bar_chart.png"], create_bar_chart,
+                     (df[keys + ['avg_memory_kb']], 'avg_memory_kb', 'Model Server Memory (KB) by Task')))
+    jobs += [
+        (["performance_vs_latency.png"], create_performance_vs_latency_scatter, (df[keys + ['avg_score', 'avg_latency_sec']],)),
+        (["performance_dashboard.png"], create_performance_dashboard, (df[keys + ['avg_score', 'avg_latency_sec', 'avg_memory_kb']],)),
+        (["radar_chart.png"], create_enhanced_radar_chart, (df[keys + ['avg_score']],)),
+        (["score_heatmap.png", "latency_heatmap.png"], create_enhanced_heatmap, (df[keys + ['avg_score', 'avg_latency_sec']],)),
+    ]
+
+    # distributions need the per-item records, not just the summary
+    if latencies is not None and not latencies.empty:
+        jobs.append((["latency_distribution.png"], create_latency_distributions, (latencies,)))
+
+    # load-test levels, when a sweep was run
+    if capacity:
+        jobs.append((["saturation_curves.png"], create_saturation_curves, (pd.DataFrame(capacity),)))
+
+    # changes against the previous run in the history
+    if regression and regression["changes"]:
+        jobs.append((["regression_diff.png"], create_regression_chart, (regression_frame(regression),)))
+
+    return [(files, fn, args + (results_dir,)) for files, fn, args in jobs]
+
+def _job_hash(fn, args):
+    digest = hashlib.sha256(inspect.getsource(fn).encode())
+    for arg in args[:-1]:
+        if isinstance(arg, pd.DataFrame):
+            digest.update(repr(list(arg.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(arg, index=False).values.tobytes())
+        else:
+            digest.update(repr(arg).encode())
+    return digest.hexdigest()
+
+def _load_manifest(results_dir):
+    try:
+        with open(os.path.join(results_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _render(fn, args):
+    fn(*args)
+
+@traced()
+def create_visualizations(summary, results_dir='results', all_results=None, capacity=None,
+                          df=None, workers=None, force=False, regression=None):
+    """
+    Draws every figure with the Agg backend. Figures are independent, so stale ones are
+    rendered in parallel worker processes; a figure whose inputs and plotting code match
+    the last render (and whose file still exists) is skipped unless `force`.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    df = summary_frame(summary) if df is None else df
+    latencies = latency_frame(all_results) if all_results else None
+    jobs = figure_jobs(df, results_dir, latencies, capacity, regression)
+
+    manifest = _load_manifest(results_dir)
+    stale = []
+    for files, fn, args in jobs:
+        job_hash = _job_hash(fn, args)
+        fresh = all(manifest.get(name) == job_hash and os.path.exists(os.path.join(results_dir, name)) for name in files)
+        if force or not fresh:
+            stale.append((files, fn, args, job_hash))
+    print(f"🖼️ {len(stale)} of {len(jobs)} figures to render")
+
+    workers = workers or min(len(stale), os.cpu_count() or 1)
+    if workers <= 1:
+        if stale:
+            _init_worker()
+        outcomes = []
+        for files, fn, args, _ in stale:
+            try:
+                outcomes.append(_render(fn, args))
+            except Exception as e:
+                outcomes.append(e)
+    else:
+        # spawned, not forked: the sampler, scheduler and sandbox pump threads are still alive here
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(_render, fn, args) for _, fn, args, _ in stale]
+            outcomes = [f.exception() for f in futures]
+
+    for (files, fn, _, job_hash), error in zip(stale, outcomes):
+        if error is not None:
+            print(f"⚠️ {fn.__name__} failed: {error}")
+            continue
+        for name in files:
+            manifest[name] = job_hash
+    with open(os.path.join(results_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
 
 def create_bar_chart(df, metric, title, results_dir):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     plt.figure(figsize=(10, 6))
     sns.barplot(x="task", y=metric, hue="model", data=df)
     plt.title(title)
@@ -51,6 +158,9 @@ def create_bar_chart(df, metric, title, results_dir):
     plt.close()
 
 def create_performance_vs_latency_scatter(df, results_dir):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     plt.figure(figsize=(8, 6))
     sns.scatterplot(data=df, x="avg_latency_sec", y="avg_score", hue="model", style="task", s=100)
     plt.title("Performance vs Latency")
@@ -61,13 +171,16 @@ def create_performance_vs_latency_scatter(df, results_dir):
     plt.close()
 
 def create_performance_dashboard(df, results_dir):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     fig, axs = plt.subplots(1, 3, figsize=(18, 6))
     sns.barplot(ax=axs[0], x="task", y="avg_score", hue="model", data=df)
     axs[0].set_title("Accuracy")
     sns.barplot(ax=axs[1], x="task", y="avg_latency_sec", hue="model", data=df)
     axs[1].set_title("Latency (sec)")
     sns.barplot(ax=axs[2], x="task", y="avg_memory_kb", hue="model", data=df)
-    axs[2].set_title("Memory (KB)")
+    axs[2].set_title("Server Memory (KB)")
     for ax in axs:
         for bar in ax.patches:
             height = bar.get_height()
@@ -103,13 +216,12 @@ def create_enhanced_radar_chart(df, results_dir):
     plt.savefig(os.path.join(results_dir, "radar_chart.png"))
     plt.close()
 
-def create_enhanced_heatmap(summary, results_dir):
+def create_enhanced_heatmap(df, results_dir):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # Score Heatmap
-    scores = {
-        model: {task: metrics["avg_score"] for task, metrics in tasks.items()}
-        for model, tasks in summary.items()
-    }
-    df_score = pd.DataFrame(scores).T
+    df_score = df.pivot(index="model", columns="task", values="avg_score")
     plt.figure(figsize=(8, 6))
     sns.heatmap(df_score, annot=True, cmap="YlGnBu", fmt=".2f")
     plt.title("Heatmap of Accuracy by Model & Task")
@@ -117,13 +229,92 @@ def create_enhanced_heatmap(summary, results_dir):
     plt.close()
 
     # Latency Heatmap
-    latency = {
-        model: {task: metrics["avg_latency_sec"] for task, metrics in tasks.items()}
-        for model, tasks in summary.items()
-    }
-    df_latency = pd.DataFrame(latency).T
+    df_latency = df.pivot(index="model", columns="task", values="avg_latency_sec")
     plt.figure(figsize=(8, 6))
     sns.heatmap(df_latency, annot=True, cmap="YlOrRd", fmt=".2f")
     plt.title("Heatmap of Latency by Model & Task")
     plt.savefig(os.path.join(results_dir, "latency_heatmap.png"))
     plt.close()
+
+def create_latency_distributions(latencies, results_dir):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    task_names = list(latencies["task"].unique())
+    fig, axs = plt.subplots(2, len(task_names), figsize=(5 * len(task_names), 9), squeeze=False)
+    for col, task in enumerate(task_names):
+        task_df = latencies[latencies["task"] == task]
+
+        # top row: histogram per model, bottom row: empirical CDF per model
+        sns.histplot(ax=axs[0][col], data=task_df, x="latency", hue="model", element="step", stat="density", common_norm=False)
+        axs[0][col].set_title(f"{task}: latency histogram")
+        axs[0][col].set_xlabel("Latency (sec)")
+
+        sns.ecdfplot(ax=axs[1][col], data=task_df, x="latency", hue="model")
+        axs[1][col].set_title(f"{task}: latency CDF")
+        axs[1][col].set_xlabel("Latency (sec)")
+        for p in (0.5, 0.9, 0.99):
+            axs[1][col].axhline(p, color="gray", linestyle=":", linewidth=0.8)
+
+    plt.tight_layout()
+    plt.savefig(os.path.join(results_dir, "latency_distribution.png"))
+    plt.close()
+
+def create_saturation_curves(df, results_dir):
+    import matplotlib.pyplot as plt
+
+    modes = [m for m in ("closed", "open") if m in set(df["mode"])]
+    x_labels = {"closed": "Concurrent requests", "open": "Offered load (req/s)"}
+
+    # one row per load mode: achieved throughput, token throughput, tail latency
+    fig, axs = plt.subplots(len(modes), 3, figsize=(18, 5 * len(modes)), squeeze=False)
+    for row, mode in enumerate(modes):
+        mode_df = df[df["mode"] == mode].sort_values("level")
+        for i, (model, model_df) in enumerate(mode_df.groupby("model")):
+            color = f"C{i}"
+            axs[row][0].plot(model_df["level"], model_df["rps"], marker="o", color=color, label=model)
+            axs[row][1].plot(model_df["level"], model_df["tokens_per_sec"], marker="o", color=color, label=model)
+            axs[row][2].plot(model_df["level"], model_df["p50_latency_sec"], marker="o", color=color, label=f"{model} p50")
+            axs[row][2].plot(model_df["level"], model_df["p95_latency_sec"], marker="o", color=color, linestyle="--", label=f"{model} p95")
+        if mode == "open":
+            # achieved == offered until the server saturates
+            levels = mode_df["level"].unique()
+            axs[row][0].plot(levels, levels, color="gray", linestyle=":", label="offered")
+
+        for ax, title in zip(axs[row], ("Throughput (req/s)", "Tokens/sec", "Latency (sec)")):
+            ax.set_title(f"{title} — {mode} loop")
+            ax.set_xlabel(x_labels[mode])
+            ax.legend()
+
+    plt.tight_layout()
+    plt.savefig(os.path.join(results_dir, "saturation_curves.png"))
+    plt.close()
+
+def create_regression_chart(df, results_dir):
+    import matplotlib.pyplot as plt
+
+    # one panel per metric: relative change of each model/task against the base run,
+    # with its interval; only the flagged changes are coloured
+    colors = {"regression": "tab:red", "improvement": "tab:green", "no change": "lightgray"}
+    metrics = list(df["metric"].unique())
+    fig, axs = plt.subplots(1, len(metrics), figsize=(5 * len(metrics), 1 + 0.4 * df.groupby("metric").size().max()),
+                            squeeze=False)
+    for ax, metric in zip(axs[0], metrics):
+        metric_df = df[df["metric"] == metric].iloc[::-1]
+        labels = metric_df["model"] + " | " + metric_df["task"]
+        errors = [metric_df["change_pct"] - metric_df["ci_low_pct"], metric_df["ci_high_pct"] - metric_df["change_pct"]]
+        ax.barh(labels, metric_df["change_pct"], xerr=errors, color=metric_df["verdict"].map(colors), capsize=3)
+        ax.axvline(0, color="black", linewidth=0.8)
+        ax.set_title(metric)
+        ax.set_xlabel("Change vs base run (%)")
+
+    fig.suptitle("Changes against the base run")
+    plt.tight_layout()
+    plt.savefig(os.path.join(results_dir, "regression_diff.png"))
+    plt.close()
+
+def draw_regression(regression, results_dir):
+    """Just the diff chart, for comparing two stored runs outside a benchmark run."""
+    os.makedirs(results_dir, exist_ok=True)
+    _init_worker()
+    create_regression_chart(regression_frame(regression), results_dir)
@@ -1,35 +1,428 @@
-from benchmark_framework.tasks import load_all_benchmarks
-from benchmark_framework.benchmark import LLMBenchmark
-from benchmark_framework.visualization import create_visualizations
-from benchmark_framework.report import generate_report
+import argparse
+import os
+import sys
+
+from benchmark_framework.tasks import TASK_BUILDERS, load_all_benchmarks
+from benchmark_framework.backends import MockBackend
+from benchmark_framework.benchmark import LLMBenchmark, summarize
+from benchmark_framework.adaptive import load_adaptive, save_adaptive
+from benchmark_framework.dispatcher import parse_endpoint
+from benchmark_framework.history import RunHistory, compare_runs, git_commit, load_regression, save_regression
+from benchmark_framework.loadtest import LoadTest, load_capacity, load_prompts, save_capacity
+from benchmark_framework.store import ResultStore
+from benchmark_framework import tracing
+
+
+def parse_shard(value):
+    index, count = (int(part) for part in value.split("/"))
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard must be i/n with 0 <= i < n, got {value}")
+    return index, count
+
+
+def parse_keep_alive(value):
+    if value == "default":
+        return None
+    # Ollama takes a number of seconds or a duration string like "30m"
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def parse_levels(value):
+    return [float(v) if "." in v else int(v) for v in value.split(",") if v]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark local LLMs served by Ollama.")
+    parser.add_argument("--models", default="llama3:8b", help="comma-separated models to benchmark")
+    parser.add_argument("--results-dir", default="results", help="where results, figures and the report go")
+    parser.add_argument("--report-only", action="store_true",
+                        help="don't run anything; re-render the figures and report from --results-dir")
+    parser.add_argument("--figure-workers", type=int, default=None,
+                        help="processes rendering figures in parallel (default: one per stale figure, up to the CPU count)")
+    parser.add_argument("--redraw", action="store_true", help="render every figure even if its inputs are unchanged")
+    parser.add_argument("--resume", action="store_true",
+                        help="keep the records already in --results-dir and only run the missing ones")
+    parser.add_argument("--rescore", action="store_true",
+                        help="don't run anything; re-score the records in --results-dir with the current scorers, then re-render")
+    parser.add_argument("--data-dir", default="data", help="directory with the task files")
+    parser.add_argument("--tasks", default=None, help="comma-separated task types (default: all registered)")
+    parser.add_argument("--limit", type=int, default=None, help="max items per task")
+    parser.add_argument("--shard", type=parse_shard, default=None, help="run shard i of n, e.g. 0/4")
+    parser.add_argument("--sample", type=int, default=None, help="seeded random subset of this many items per task")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --sample")
+    parser.add_argument("--host", default=None, help="Ollama server URL (defaults to OLLAMA_HOST)")
+    parser.add_argument("--endpoint", action="append", type=parse_endpoint, default=None,
+                        help="Ollama host as HOST=model1,model2@CONCURRENCY; repeat for several hosts (replaces --host)")
+    parser.add_argument("--backend", choices=["ollama", "mock"], default="ollama",
+                        help="'mock' runs offline with simulated responses and timings")
+    parser.add_argument("--mock-latency", type=float, default=0.2, help="mock backend mean base latency (sec)")
+    parser.add_argument("--mock-tokens-per-sec", type=float, default=40.0, help="mock backend decode rate")
+    parser.add_argument("--mock-time-scale", type=float, default=1.0,
+                        help="multiplier on mock delays; 0 measures harness overhead only")
+    parser.add_argument("--mock-replay", default=None, help="JSONL of recorded responses for the mock backend")
+    parser.add_argument("--mock-parallel", type=int, default=None,
+                        help="requests the mock backend serves at once; the rest queue (default: unlimited)")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once (1 = serial)")
+    parser.add_argument("--max-per-model", type=int, default=None, help="in-flight cap per model")
+    parser.add_argument("--max-per-server", type=int, default=None, help="in-flight cap per server")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="overlap generation and scoring in separate worker stages")
+    parser.add_argument("--score-workers", type=int, default=2, help="scoring threads in --pipeline mode")
+    parser.add_argument("--queue-size", type=int, default=64, help="bounded queue size between pipeline stages")
+    parser.add_argument("--bert-batch-size", type=int, default=64, help="pairs per BERTScore batch")
+    parser.add_argument("--cache", default=None,
+                        help="response cache used to skip repeated generations and resume runs "
+                             "(default: <results-dir>/response_cache.sqlite)")
+    parser.add_argument("--no-cache", action="store_true", help="always query the model")
+    parser.add_argument("--score-cache", default=None,
+                        help="memoized scores, keyed by scorer version, so repeated (response, answer) pairs are scored once "
+                             "(default: <results-dir>/score_cache.sqlite)")
+    parser.add_argument("--no-score-cache", action="store_true", help="always recompute scores")
+    parser.add_argument("--score-processes", type=int, default=None,
+                        help="processes for the CPU-bound scorers (default: one per CPU)")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream responses to measure time-to-first-token and inter-token latency")
+    parser.add_argument("--server-process", default="ollama",
+                        help="process name of the local model server to sample RSS/CPU from")
+    parser.add_argument("--sample-interval", type=float, default=0.1,
+                        help="resource sampling interval (sec)")
+    parser.add_argument("--keep-alive", default="-1",
+                        help="how long Ollama keeps each model loaded while it is benchmarked, e.g. 30m "
+                             "(-1 = until it is unloaded at the end; 'default' = server setting)")
+    parser.add_argument("--order", choices=["prefix", "dataset"], default="prefix",
+                        help="'prefix' groups prompts sharing a template prefix so the server's prompt cache is reused")
+    parser.add_argument("--warmup", type=int, default=1, help="unrecorded warmup requests per model")
+    parser.add_argument("--repetitions", type=int, default=1, help="times each item is run")
+    parser.add_argument("--no-cold-start", action="store_true",
+                        help="don't unload and reload each model to measure cold start")
+    parser.add_argument("--code-workers", type=int, default=4, help="sandbox worker processes for code tasks")
+    parser.add_argument("--code-timeout", type=float, default=10.0, help="wall-clock limit per code item (sec)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="compare models on randomly ordered items and stop once the ranking is settled")
+    parser.add_argument("--adaptive-batch", type=int, default=8, help="items per model between interim checks")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="confidence level of the adaptive intervals and of run comparisons")
+    parser.add_argument("--tie-margin", type=float, default=0.02,
+                        help="score difference below which two models count as tied")
+    parser.add_argument("--min-items", type=int, default=20, help="items before a pair can be called")
+    parser.add_argument("--token-budget", type=int, default=None, help="stop the adaptive run after this many tokens")
+    parser.add_argument("--time-budget", type=float, default=None, help="stop the adaptive run after this many seconds")
+    parser.add_argument("--loadtest", action="store_true",
+                        help="after the benchmark, replay task prompts at increasing load to measure capacity")
+    parser.add_argument("--load-concurrency", type=parse_levels, default=[1, 2, 4, 8],
+                        help="closed-loop concurrency sweep, e.g. 1,2,4,8")
+    parser.add_argument("--load-rates", type=parse_levels, default=[],
+                        help="open-loop Poisson arrival rates (req/s) to test, e.g. 0.5,1,2")
+    parser.add_argument("--load-requests", type=int, default=32, help="requests sent per load level")
+    parser.add_argument("--history", default=None,
+                        help="run history database; each run is recorded and compared with the one before "
+                             "(default: <results-dir>/history.sqlite)")
+    parser.add_argument("--no-history", action="store_true", help="don't record this run in the history")
+    parser.add_argument("--run-label", default=None, help="label stored with the run in the history")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), default=None,
+                        help="don't run anything; compare two recorded runs (ids, 'latest' or 'previous')")
+    parser.add_argument("--regression-threshold", type=float, default=0.05,
+                        help="smallest relative change reported as a regression or improvement")
+    parser.add_argument("--trace", action="store_true",
+                        help="record phase timings to results/trace.json and add a time breakdown to the report")
+    parser.add_argument("--profile", choices=["cprofile", "sample"], default=None,
+                        help="also profile the run (implies --trace)")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="stack sampling interval (sec) for --profile sample")
+    args = parser.parse_args()
+
+    if args.tasks:
+        unknown = [t for t in args.tasks.split(",") if t not in TASK_BUILDERS]
+        if unknown:
+            parser.error(f"unknown task(s) {', '.join(unknown)}; registered tasks: {', '.join(TASK_BUILDERS)}")
+
+    # the adaptive loop runs every model itself, on the default host
+    if args.adaptive and (args.endpoint or args.pipeline):
+        parser.error("--adaptive runs on a single host without the pipeline; drop --endpoint/--pipeline")
+    # adaptive runs pick their own items and stop early, so there's no fixed set to complete
+    if args.adaptive and args.resume:
+        parser.error("--resume can't be used with --adaptive")
+    # the pipeline is a single-host mode; dispatched runs score each chunk of records in
+    # between, and the hosts idle once their window is done
+    if args.pipeline and args.endpoint:
+        parser.error("--pipeline is single-host only; with --endpoint records are scored between chunks of generation")
+
+    # caches and the run history live with the results unless given explicitly
+    for name, filename in (("cache", "response_cache.sqlite"), ("score_cache", "score_cache.sqlite"),
+                           ("history", "history.sqlite")):
+        if getattr(args, name) is None:
+            setattr(args, name, os.path.join(args.results_dir, filename))
+    return args
+
+
+def render(args, summary, results, capacity=None, adaptive=None, regression=None):
+    # pandas/matplotlib/seaborn are only imported here, once there is something to draw
+    from benchmark_framework.frames import summary_frame
+    from benchmark_framework.report import generate_report
+    from benchmark_framework.visualization import create_visualizations
+
+    # an empty task file or shard leaves nothing to draw
+    if not summary:
+        print(f"⚠️ No results to report in {args.results_dir}")
+        return
+    df = summary_frame(summary)
+
+    # Generate visualizations
+    print(" Generating visualizations...")
+    create_visualizations(summary, results_dir=args.results_dir, all_results=results, capacity=capacity,
+                          df=df, workers=args.figure_workers, force=args.redraw, regression=regression)
+
+    # Generate report
+    print(" Generating markdown report...")
+    generate_report(summary, results, output_dir=args.results_dir, capacity=capacity, df=df, adaptive=adaptive,
+                    regression=regression)
+
+
+def report_only(args):
+    store = ResultStore(args.results_dir)
+    summary = store.load_summary()
+    if summary is None:
+        # resumed or summary-less run: recompute, carrying cold starts over since they aren't in the metrics
+        saved = store.load_summary(allow_stale=True) or {}
+        cold_starts = {}
+        for model, tasks in saved.items():
+            for row in list(tasks.values())[:1]:
+                by_host = row.get("cold_start_by_host") or {
+                    None: {"cold_start_sec": row.get("cold_start_sec"), "load_sec": row.get("cold_load_sec")}
+                }
+                cold_starts.update(((model, host), cold) for host, cold in by_host.items())
+        summary = summarize(store, cold_starts)
+        if not summary:
+            print(f"⚠️ No results in {args.results_dir}; run the benchmark first")
+            return
+        store.save_summary(summary)
+
+    render(args, summary, store, load_capacity(args.results_dir), load_adaptive(args.results_dir),
+           load_regression(args.results_dir))
+    print(f" Report re-rendered in '{args.results_dir}/'.")
+
+
+def print_changes(regression):
+    flagged = [c for c in regression["changes"] if c["verdict"] != "no change"]
+    print(f"🔍 Run {regression['new_run']} vs run {regression['base_run']}: "
+          f"{sum(c['verdict'] == 'regression' for c in flagged)} regressions, "
+          f"{sum(c['verdict'] == 'improvement' for c in flagged)} improvements "
+          f"in {len(regression['changes'])} comparisons")
+    for c in flagged:
+        icon = "🔻" if c["verdict"] == "regression" else "🔺"
+        change = f"{c['change_pct']:+.1f}%" if c["change_pct"] is not None else f"{c['diff']:+.3f}"
+        print(f"  {icon} {c['model']} | {c['task']} | {c['metric']}: {c['base_mean']:.3f} → {c['new_mean']:.3f} ({change})")
+
+
+def record_history(args, benchmark, results, summary):
+    """Records the run and returns its comparison with the previous run, if there is one with items in common."""
+    options = {k: v for k, v in vars(args).items() if k != "endpoint"}
+    options["hosts"] = [ep.host for ep in args.endpoint] if args.endpoint else [benchmark.host]
+
+    history = RunHistory(args.history)
+    try:
+        run_id = history.record_run(results, summary, benchmark.model_digests(), options=options, label=args.run_label,
+                                    commit=git_commit(os.path.dirname(os.path.abspath(__file__))))
+        print(f"🗂️ Recorded run {run_id} in {args.history}")
+        try:
+            base = history.resolve("previous", before=run_id)
+        except ValueError:
+            return None
+        regression = compare_runs(history, base, run_id, args.confidence, args.regression_threshold)
+    finally:
+        history.close()
+
+    if not regression["changes"]:
+        print(f"⚠️ Run {run_id} has no items in common with run {base}; nothing to compare")
+        return None
+    print_changes(regression)
+    return regression
+
+
+def compare(args):
+    # pandas/matplotlib are only needed here, for the chart and the report
+    from benchmark_framework.report import generate_regression_report
+    from benchmark_framework.visualization import draw_regression
+
+    # read-only, so comparing against a results dir without a history doesn't create one
+    try:
+        history = RunHistory(args.history, read_only=True)
+    except FileNotFoundError as e:
+        sys.exit(f"{e}; record a run first or point --history at one")
+    try:
+        new = history.resolve(args.compare[1])
+        base = history.resolve(args.compare[0], before=new)
+        regression = compare_runs(history, base, new, args.confidence, args.regression_threshold)
+    except ValueError as e:
+        ids = [str(run["run_id"]) for run in history.runs()]
+        sys.exit(f"{e}; recent runs: {', '.join(ids) or 'none'}")
+    finally:
+        history.close()
+
+    if not regression["changes"]:
+        print(f"⚠️ Runs {base} and {new} have no items in common")
+        return
+    print_changes(regression)
+    output_dir = os.path.join(args.results_dir, f"compare_{base}_{new}")
+    draw_regression(regression, output_dir)
+    generate_regression_report(regression, output_dir)
+
+
+def rescore(args):
+    benchmark = LLMBenchmark(
+        args.models.split(","), {},
+        bert_batch_size=args.bert_batch_size,
+        code_workers=args.code_workers,
+        code_timeout=args.code_timeout,
+        results_dir=args.results_dir,
+        score_cache_path=None if args.no_score_cache else args.score_cache,
+        score_processes=args.score_processes,
+    )
+    print(f" Re-scoring results in '{args.results_dir}/'...")
+    benchmark.rescore()
+    # the metrics are now newer than the summary, so report_only recomputes it
+    report_only(args)
 
 
 def main():
+    args = parse_args()
+    if args.rescore:
+        rescore(args)
+        return
+    if args.report_only:
+        report_only(args)
+        return
+    if args.compare:
+        compare(args)
+        return
+
+    tracer = tracing.enable() if args.trace or args.profile else None
+    profiler = tracing.Profiler(args.profile, args.profile_interval) if args.profile else None
+    if profiler:
+        profiler.start()
+
     # Define models to benchmark
-    models = ["llama3:8b"] #"mistral"
+    models = args.models.split(",") #"llama3:8b,mistral"
 
-    # Load all benchmark tasks
+    # Load all benchmark tasks (lazily; items are read as they are run)
     print(" Loading benchmark tasks...")
-    tasks = load_all_benchmarks("data")
+    tasks = load_all_benchmarks(
+        args.data_dir,
+        task_names=args.tasks.split(",") if args.tasks else None,
+        limit=args.limit,
+        shard=args.shard,
+        sample=args.sample,
+        seed=args.seed,
+    )
+    # nothing to run; stop before cold starts and warmups, and before an empty run reaches the history
+    if not tasks:
+        sys.exit(f"No task data found in '{args.data_dir}'")
+
+    backend = None
+    if args.backend == "mock":
+        backend = MockBackend(
+            latency_sec=args.mock_latency,
+            tokens_per_sec=args.mock_tokens_per_sec,
+            time_scale=args.mock_time_scale,
+            replay_path=args.mock_replay,
+            models=models,
+            num_parallel=args.mock_parallel,
+        )
 
     # Initialize and run the benchmark
-    benchmark = LLMBenchmark(models, tasks)
-    print(" Running benchmarks...")
-    results = benchmark.run_benchmarks()
+    benchmark = LLMBenchmark(
+        models, tasks,
+        host=args.host,
+        endpoints=args.endpoint,
+        backend=backend,
+        pipeline=args.pipeline,
+        score_workers=args.score_workers,
+        queue_size=args.queue_size,
+        concurrency=args.concurrency,
+        max_per_model=args.max_per_model,
+        max_per_server=args.max_per_server,
+        bert_batch_size=args.bert_batch_size,
+        cache_path=None if args.no_cache else args.cache,
+        code_workers=args.code_workers,
+        code_timeout=args.code_timeout,
+        stream=args.stream,
+        server_process=args.server_process,
+        sample_interval=args.sample_interval,
+        warmup=args.warmup,
+        repetitions=args.repetitions,
+        measure_cold_start=not args.no_cold_start,
+        results_dir=args.results_dir,
+        keep_alive=parse_keep_alive(args.keep_alive),
+        order=args.order,
+        score_cache_path=None if args.no_score_cache else args.score_cache,
+        score_processes=args.score_processes,
+        resume=args.resume,
+    )
+    if args.adaptive:
+        print(" Running adaptive comparison...")
+        results = benchmark.run_adaptive(
+            batch_size=args.adaptive_batch,
+            confidence=args.confidence,
+            margin=args.tie_margin,
+            min_items=args.min_items,
+            token_budget=args.token_budget,
+            time_budget=args.time_budget,
+            seed=args.seed,
+        )
+        save_adaptive(benchmark.adaptive_result, args.results_dir)
+    else:
+        print(" Running benchmarks...")
+        results = benchmark.run_benchmarks()
+        # don't let a report-only re-render pick up an earlier adaptive run's summary
+        if load_adaptive(args.results_dir) is not None:
+            os.remove(os.path.join(args.results_dir, "adaptive.json"))
 
     # Calculate summary statistics
     print(" Summarizing results...")
     summary = benchmark.get_summary_statistics()
+    results.save_summary(summary)
 
-    # Generate visualizations
-    print(" Generating visualizations...")
-    create_visualizations(summary, results_dir="results")
+    # Record the run and compare it with the previous one
+    regression = None if args.no_history or not summary else record_history(args, benchmark, results, summary)
+    if regression is not None:
+        save_regression(regression, args.results_dir)
+    elif load_regression(args.results_dir) is not None:
+        os.remove(os.path.join(args.results_dir, "regression.json"))
 
-    # Generate report
-    print(" Generating markdown report...")
-    generate_report(summary, results, output_dir="results")
+    # Measure throughput under concurrent load
+    capacity = None
+    if args.loadtest:
+        print(" Running load test...")
+        prompts = load_prompts(tasks, args.limit)
+        # with several hosts each one is swept on its own, over the models it serves
+        if args.endpoint:
+            targets = [(ep.client, [m for m in models if m in ep.models], ep.host) for ep in args.endpoint]
+        else:
+            targets = [(benchmark.client, models, None)]
+        capacity = []
+        for client, target_models, host in targets:
+            loadtest = LoadTest(client, prompts, options=benchmark.options, requests_per_level=args.load_requests,
+                                seed=args.seed, keep_alive=benchmark.keep_alive, host=host)
+            capacity += loadtest.sweep(target_models, args.load_concurrency, args.load_rates)
+        save_capacity(capacity, args.results_dir)
+    else:
+        # an earlier sweep measured other models or settings; don't report it with this run
+        for name in ("loadtest.jsonl", "saturation_curves.png"):
+            path = os.path.join(args.results_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    render(args, summary, results, capacity, benchmark.adaptive_result, regression)
+
+    if profiler:
+        profiler.stop()
+        profiler.save(args.results_dir)
+    if tracer:
+        tracer.export_chrome_trace(os.path.join(args.results_dir, "trace.json"))
 
-    print(" Benchmark complete. See results in the 'results/' directory.")
+    print(f" Benchmark complete. See results in the '{args.results_dir}/' directory.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+import time
+
+from benchmark_framework.dispatcher import Dispatcher, Endpoint
+
+
+def endpoint(host, models=("m",), cap=1):
+    # execute() below never touches the client, so no server is needed
+    return Endpoint(host, models, cap, client=object())
+
+
+def test_every_unit_runs_once():
+    dispatcher = Dispatcher([endpoint("a", cap=2), endpoint("b", cap=3)])
+    results = list(dispatcher.run((("m", i) for i in range(50)), lambda ep, model, i: i * 2))
+
+    assert sorted(r for _, _, r in results) == [i * 2 for i in range(50)]
+    assert sum(s["completed"] for s in dispatcher.stats.values()) == 50
+
+
+def test_idle_host_steals_from_slow_one():
+    def execute(ep, model, i):
+        time.sleep(0.05 if ep.host == "slow" else 0.001)
+        return ep.host
+
+    # a window covering every unit deals them all up front, half to each host
+    dispatcher = Dispatcher([endpoint("slow"), endpoint("fast")], window=20)
+    hosts = [r for _, _, r in dispatcher.run((("m", i) for i in range(20)), execute)]
+
+    assert len(hosts) == 20
+    assert dispatcher.stats["fast"]["stolen"] > 0
+    assert hosts.count("fast") > hosts.count("slow")
+
+
+def test_stealing_respects_served_models():
+    def execute(ep, model, i):
+        time.sleep(0.01)
+        return ep.host
+
+    dispatcher = Dispatcher([endpoint("a", models=("x",)), endpoint("b", models=("x", "y"))], window=20)
+    results = list(dispatcher.run([("y", i) for i in range(5)] + [("x", i) for i in range(5)], execute))
+
+    assert all(host == "b" for model, _, host in results if model == "y")
+
+
+def test_failed_unit_is_retried_on_another_host():
+    def execute(ep, model, i):
+        if ep.host == "broken":
+            raise ConnectionError("down")
+        return i
+
+    dispatcher = Dispatcher([endpoint("broken"), endpoint("ok")])
+    results = list(dispatcher.run((("m", i) for i in range(10)), execute))
+
+    assert sorted(r for _, _, r in results) == list(range(10))
+    assert dispatcher.stats["broken"]["failed"] > 0
+    assert dispatcher.stats["ok"]["completed"] == 10
+
+
+def test_unit_failing_everywhere_yields_its_error():
+    def execute(ep, model, i):
+        raise ConnectionError(ep.host)
+
+    dispatcher = Dispatcher([endpoint("a"), endpoint("b")], max_attempts=3)
+    results = list(dispatcher.run((("m", i) for i in range(4)), execute))
+
+    assert len(results) == 4
+    assert all(isinstance(r, ConnectionError) for _, _, r in results)
+    assert sum(s["failed"] for s in dispatcher.stats.values()) == 4 * 3
+
+
+def test_units_are_pulled_a_window_at_a_time():
+    pulled = 0
+
+    def units():
+        nonlocal pulled
+        for i in range(100):
+            pulled += 1
+            yield "m", i
+
+    dispatcher = Dispatcher([endpoint("a", cap=2)], window=4)
+    yielded = 0
+    for _ in dispatcher.run(units(), lambda ep, model, i: i):
+        yielded += 1
+        # in flight plus finished-but-not-yet-handed-back, each at most a window
+        assert pulled - yielded <= 2 * 4
+    assert pulled == yielded == 100
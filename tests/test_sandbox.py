@@ -0,0 +1,46 @@
+from benchmark_framework.sandbox import CodeSandbox, generate_inputs
+
+REFERENCE = "def add(a, b):\n    return a + b\n"
+WRONG = "def add(a, b):\n    return a - b\n"
+
+# a wrong answer that also tampers with the worker: fakes its own reply and makes every
+# later comparison succeed
+TAMPERING = """
+import builtins, json, sys
+json.dumps = lambda *args, **kwargs: '{"ok": true, "passed": 10, "total": 10}'
+sys.modules["__main__"].same_output = lambda a, b: True
+builtins.repr = lambda x: "0"
+
+def add(a, b):
+    return a * b + 1
+"""
+
+
+def job(candidate):
+    return {"candidate": candidate, "reference": REFERENCE, "inputs": generate_inputs(REFERENCE)}
+
+
+def test_tampering_candidate_does_not_leak_into_later_jobs():
+    # one worker, so every job lands on the same process
+    sandbox = CodeSandbox(workers=1, timeout=5)
+    try:
+        tampered, wrong, right = sandbox.run_many([job(TAMPERING), job(WRONG), job(REFERENCE)])
+    finally:
+        sandbox.close()
+
+    assert tampered["ok"] and tampered["passed"] < tampered["total"]
+    # a - b only matches a + b when b == 0
+    assert wrong["ok"] and wrong["passed"] < wrong["total"]
+    assert right == {"ok": True, "passed": right["total"], "total": right["total"]}
+
+
+def test_overrunning_candidate_times_out_and_worker_survives():
+    sandbox = CodeSandbox(workers=1, timeout=1)
+    try:
+        hung = sandbox.run(job("def add(a, b):\n    while True:\n        pass\n"))
+        right = sandbox.run(job(REFERENCE))
+    finally:
+        sandbox.close()
+
+    assert not hung["ok"] and hung["error"].startswith("timed out")
+    assert right["ok"] and right["passed"] == right["total"]